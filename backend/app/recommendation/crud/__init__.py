@@ -1,4 +1,5 @@
 from .course import course_dao
+from .course_dialogue import course_dialogue_dao
 from .video_summary import video_summary_dao
 from .summary_embedding import summary_embedding_dao
 from .report import report_dao
@@ -6,6 +7,7 @@ from .report_embedding import report_embedding_dao
 
 __all__ = [
     course_dao,
+    course_dialogue_dao,
     video_summary_dao,
     summary_embedding_dao,
     report_dao,
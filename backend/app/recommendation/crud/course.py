@@ -79,6 +79,11 @@ class CRUDCourse:
         result = await db.execute(stmt)
         return result.scalar_one_or_none()
 
+    async def find_by_course_id_async(self, db: AsyncSession, *, course_id: str) -> Optional[Course]:
+        stmt = select(Course).where(Course.course_id == course_id)
+        result = await db.execute(stmt)
+        return result.scalar_one_or_none()
+
     async def update_async(
         self, db: AsyncSession, *, db_obj: Course, obj_in: CourseUpdate
     ) -> Course:
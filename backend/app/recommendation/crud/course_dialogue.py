@@ -0,0 +1,80 @@
+import json
+
+import zstandard
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import inspect, select, text
+from typing import Any, Dict, List, Optional
+
+from backend.app.recommendation.model import Course, CourseDialogue
+
+_ZSTD_LEVEL = 10
+
+
+def compress_dialogue(raw: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=_ZSTD_LEVEL).compress(raw)
+
+
+def decompress_dialogue(data: bytes) -> List[Dict[str, Any]]:
+    return json.loads(zstandard.ZstdDecompressor().decompress(data))
+
+
+class CRUDCourseDialogue:
+    _has_legacy_column: Optional[bool] = None  # courses 表是否仍保留旧的 dialogue 列
+
+    async def save_async(
+        self, db: AsyncSession, *, course_uuid: str, dialogue: List[Dict[str, Any]]
+    ) -> CourseDialogue:
+        raw = json.dumps(dialogue or [], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        data, raw_size = compress_dialogue(raw), len(raw)
+        db_obj = await db.get(CourseDialogue, course_uuid)
+        if db_obj is None:
+            db_obj = CourseDialogue(course_uuid=course_uuid, dialogue_zstd=data, raw_size=raw_size)
+            db.add(db_obj)
+        else:
+            db_obj.dialogue_zstd = data
+            db_obj.raw_size = raw_size
+        await db.flush()
+        return db_obj
+
+    async def get_dialogue_async(
+        self, db: AsyncSession, *, course_uuid: str
+    ) -> Optional[List[Dict[str, Any]]]:
+        stmt = select(CourseDialogue.dialogue_zstd).where(CourseDialogue.course_uuid == course_uuid)
+        result = await db.execute(stmt)
+        data = result.scalar_one_or_none()
+        if data is None:
+            return await self._get_legacy_dialogue(db, column="uuid", value=course_uuid)
+        return decompress_dialogue(data)
+
+    async def get_dialogue_by_course_id_async(
+        self, db: AsyncSession, *, course_id: str
+    ) -> Optional[List[Dict[str, Any]]]:
+        stmt = select(CourseDialogue.dialogue_zstd).join(
+            Course, Course.uuid == CourseDialogue.course_uuid
+        ).where(Course.course_id == course_id)
+        result = await db.execute(stmt)
+        data = result.scalar_one_or_none()
+        if data is None:
+            return await self._get_legacy_dialogue(db, column="course_id", value=course_id)
+        return decompress_dialogue(data)
+
+    async def _get_legacy_dialogue(
+        self, db: AsyncSession, *, column: str, value: str
+    ) -> Optional[List[Dict[str, Any]]]:
+        """尚未执行 migrate_course_dialogues 回填的课程，从 courses 表旧的 dialogue 列读取对话"""
+        if CRUDCourseDialogue._has_legacy_column is None:
+            connection = await db.connection()
+            columns = await connection.run_sync(lambda conn: inspect(conn).get_columns(Course.__tablename__))
+            CRUDCourseDialogue._has_legacy_column = any(item["name"] == "dialogue" for item in columns)
+        if not CRUDCourseDialogue._has_legacy_column:
+            return None
+        result = await db.execute(
+            text(f"SELECT dialogue FROM {Course.__tablename__} WHERE {column} = :value"), {"value": value}
+        )
+        dialogue = result.scalar_one_or_none()
+        if isinstance(dialogue, (str, bytes)):
+            dialogue = json.loads(dialogue)
+        return dialogue
+
+
+course_dialogue_dao = CRUDCourseDialogue()
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from sqlalchemy import and_, select
+from sqlalchemy import and_, bindparam, delete, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from sqlalchemy_crud_plus import CRUDPlus
@@ -62,6 +62,33 @@ class CRUDCommunity(CRUDPlus[Community]):
         """
         return await self.delete_model(db, community_id)
 
+    async def delete_by_uuids(self, db: AsyncSession, uuids: list[str]) -> int:
+        """
+        按 uuid 批量删除社区报告
+
+        :param db: 异步数据库会话
+        :param uuids: 社区报告 uuid 列表
+        :return: 返回受影响的行数
+        """
+        if not uuids:
+            return 0
+        result = await db.execute(delete(self.model).where(self.model.uuid.in_(uuids)))
+        return result.rowcount
+
+    async def bulk_update_attributes(self, db: AsyncSession, attributes: dict[str, str]) -> None:
+        """
+        批量更新社区报告的属性
+
+        :param db: 异步数据库会话
+        :param attributes: 社区报告 uuid 到新属性文本的映射
+        :return:
+        """
+        if not attributes:
+            return
+        table = self.model.__table__
+        stmt = update(table).where(table.c.uuid == bindparam('b_uuid')).values(attributes=bindparam('b_attributes'))
+        await db.execute(stmt, [{'b_uuid': uuid, 'b_attributes': value} for uuid, value in attributes.items()])
+
     async def get_list(self, db: AsyncSession, *, knowledge_graph_uuid: str, name: str = None) -> list[Community]:
         """
         获取社区报告列表
@@ -1,12 +1,14 @@
 from __future__ import annotations
-from sqlalchemy import and_, select
+from sqlalchemy import and_, bindparam, delete, insert, select, update
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from sqlalchemy_crud_plus import CRUDPlus
 
-from backend.app.recommendation.model import KnowledgeEntity, Community
+from backend.app.recommendation.model import KnowledgeEntity, Community, Embedding
+from backend.app.recommendation.model.base import uuid4_str
 from backend.app.recommendation.schema.knowledge_entity import AddKnowledgeEntityParam, UpdateKnowledgeEntityParam
+from backend.utils.timezone import timezone
 
 
 class CRUDKnowledgeEntity(CRUDPlus[KnowledgeEntity]):
@@ -67,6 +69,62 @@ class CRUDKnowledgeEntity(CRUDPlus[KnowledgeEntity]):
 
         return new_knowledge_entity.uuid
 
+    async def bulk_create(self, db: AsyncSession, objs: list[AddKnowledgeEntityParam]) -> list[str]:
+        """
+        多行插入实体，uuid 在客户端生成，无需回查即可得到映射
+
+        :param db: 异步数据库会话
+        :param objs: 实体数据对象列表
+        :return: 与 objs 顺序一致的实体 uuid 列表
+        """
+        if not objs:
+            return []
+        now = timezone.now()
+        rows = [{**obj.model_dump(), 'uuid': uuid4_str(), 'created_time': now} for obj in objs]
+        await db.execute(insert(self.model), rows)
+        return [row['uuid'] for row in rows]
+
+    async def get_uuid_map(self, db: AsyncSession, knowledge_graph_uuid: str) -> dict[tuple[str, str], str]:
+        """
+        获取图谱内 (实体名称, 实体类型) 到实体 uuid 的映射
+
+        :param db: 异步数据库会话
+        :param knowledge_graph_uuid: 图谱 uuid
+        :return: 映射字典
+        """
+        stmt = select(self.model.name, self.model.type, self.model.uuid).where(
+            self.model.knowledge_graph_uuid == knowledge_graph_uuid)
+        result = await db.execute(stmt)
+        return {(name, type_): uuid for name, type_, uuid in result.all()}
+
+    async def bulk_update_attributes(self, db: AsyncSession, attributes: dict[str, str]) -> None:
+        """
+        批量更新实体属性
+
+        :param db: 异步数据库会话
+        :param attributes: 实体 uuid 到新属性文本的映射
+        :return:
+        """
+        if not attributes:
+            return
+        table = self.model.__table__
+        stmt = update(table).where(table.c.uuid == bindparam('b_uuid')).values(attributes=bindparam('b_attributes'))
+        await db.execute(stmt, [{'b_uuid': uuid, 'b_attributes': value} for uuid, value in attributes.items()])
+
+    async def delete_by_uuids(self, db: AsyncSession, uuids: list[str]) -> int:
+        """
+        按 uuid 批量删除实体及其嵌入，社区关联由外键级联删除
+
+        :param db: 异步数据库会话
+        :param uuids: 实体 uuid 列表
+        :return: 返回受影响的行数
+        """
+        if not uuids:
+            return 0
+        await db.execute(delete(Embedding).where(Embedding.knowledge_entity_uuid.in_(uuids)))
+        result = await db.execute(delete(self.model).where(self.model.uuid.in_(uuids)))
+        return result.rowcount
+
     async def update(self, db: AsyncSession, knowledge_entity_id: int, obj: UpdateKnowledgeEntityParam) -> int:
         """
         更新实体类型
@@ -1,11 +1,13 @@
 from __future__ import annotations
-from sqlalchemy import and_, select
+from sqlalchemy import and_, bindparam, delete, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy_crud_plus import CRUDPlus
 
 from backend.app.recommendation.model import KnowledgeRelationship
+from backend.app.recommendation.model.base import uuid4_str
 from backend.app.recommendation.schema.knowledge_relationship import AddKnowledgeRelationshipParam, \
     UpdateKnowledgeRelationshipParam
+from backend.utils.timezone import timezone
 
 
 class CRUDKnowledgeRelationship(CRUDPlus[KnowledgeRelationship]):
@@ -64,6 +66,82 @@ class CRUDKnowledgeRelationship(CRUDPlus[KnowledgeRelationship]):
         db.add(new_knowledge_relationship)
         return new_knowledge_relationship.uuid
 
+    async def bulk_create(self, db: AsyncSession, objs: list[AddKnowledgeRelationshipParam]) -> list[str]:
+        """
+        多行插入关系
+
+        :param db: 异步数据库会话
+        :param objs: 关系数据对象列表
+        :return: 与 objs 顺序一致的关系 uuid 列表
+        """
+        if not objs:
+            return []
+        now = timezone.now()
+        rows = [{**obj.model_dump(), 'uuid': uuid4_str(), 'created_time': now} for obj in objs]
+        await db.execute(insert(self.model), rows)
+        return [row['uuid'] for row in rows]
+
+    async def get_source_map(self, db: AsyncSession, knowledge_graph_uuid: str) -> dict[tuple[str, str, str], tuple[str, str]]:
+        """
+        获取图谱内已有关系的 (头实体 uuid, 尾实体 uuid, 关系名称) 到 (关系 uuid, 溯源文本) 的映射
+
+        :param db: 异步数据库会话
+        :param knowledge_graph_uuid: 图谱 uuid
+        :return: 映射字典
+        """
+        stmt = select(self.model.source_entity_uuid, self.model.target_entity_uuid, self.model.name,
+                      self.model.uuid, self.model.source).where(self.model.knowledge_graph_uuid == knowledge_graph_uuid)
+        result = await db.execute(stmt)
+        return {(source_uuid, target_uuid, name): (uuid, source) for source_uuid, target_uuid, name, uuid, source in result.all()}
+
+    async def bulk_update_source(self, db: AsyncSession, sources: dict[str, str]) -> None:
+        """
+        批量更新关系的溯源文本
+
+        :param db: 异步数据库会话
+        :param sources: 关系 uuid 到新溯源文本的映射
+        :return:
+        """
+        if not sources:
+            return
+        table = self.model.__table__
+        stmt = update(table).where(table.c.uuid == bindparam('b_uuid')).values(source=bindparam('b_source'))
+        await db.execute(stmt, [{'b_uuid': uuid, 'b_source': source} for uuid, source in sources.items()])
+
+    async def bulk_update_endpoints(self, db: AsyncSession, endpoints: dict[str, tuple[str, str, str]]) -> None:
+        """
+        批量改写关系的头尾实体与溯源文本
+
+        :param db: 异步数据库会话
+        :param endpoints: 关系 uuid 到 (头实体 uuid, 尾实体 uuid, 溯源文本) 的映射
+        :return:
+        """
+        if not endpoints:
+            return
+        table = self.model.__table__
+        stmt = update(table).where(table.c.uuid == bindparam('b_uuid')).values(
+            source_entity_uuid=bindparam('b_source_entity_uuid'),
+            target_entity_uuid=bindparam('b_target_entity_uuid'),
+            source=bindparam('b_source'),
+        )
+        await db.execute(stmt, [
+            {'b_uuid': uuid, 'b_source_entity_uuid': source_uuid, 'b_target_entity_uuid': target_uuid, 'b_source': source}
+            for uuid, (source_uuid, target_uuid, source) in endpoints.items()
+        ])
+
+    async def delete_by_uuids(self, db: AsyncSession, uuids: list[str]) -> int:
+        """
+        按 uuid 批量删除关系
+
+        :param db: 异步数据库会话
+        :param uuids: 关系 uuid 列表
+        :return: 返回受影响的行数
+        """
+        if not uuids:
+            return 0
+        result = await db.execute(delete(self.model).where(self.model.uuid.in_(uuids)))
+        return result.rowcount
+
     async def update(self, db: AsyncSession, knowledge_relationship_id: int, obj: UpdateKnowledgeRelationshipParam) -> int:
         """
         更新实体类型
@@ -1,11 +1,13 @@
 from __future__ import annotations
-from sqlalchemy import and_, select
+from sqlalchemy import and_, insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy_crud_plus import CRUDPlus
 
 from backend.app.recommendation.model import SchemaEntity
+from backend.app.recommendation.model.base import uuid4_str
 from backend.app.recommendation.schema.schema_entity import AddSchemaEntityParam, UpdateSchemaEntityParam, \
     SchemaEntityBase
+from backend.utils.timezone import timezone
 
 
 class CRUDSchemaEntity(CRUDPlus[SchemaEntity]):
@@ -55,6 +57,33 @@ class CRUDSchemaEntity(CRUDPlus[SchemaEntity]):
 
         return new_schema_entity.uuid
 
+    async def bulk_create(self, db: AsyncSession, objs: list[AddSchemaEntityParam]) -> list[str]:
+        """
+        多行插入实体类型，uuid 在客户端生成，无需回查即可得到映射
+
+        :param db: 异步数据库会话
+        :param objs: 实体类型数据对象列表
+        :return: 与 objs 顺序一致的实体类型 uuid 列表
+        """
+        if not objs:
+            return []
+        now = timezone.now()
+        rows = [{**obj.model_dump(), 'uuid': uuid4_str(), 'created_time': now} for obj in objs]
+        await db.execute(insert(self.model), rows)
+        return [row['uuid'] for row in rows]
+
+    async def get_uuid_map(self, db: AsyncSession, schema_graph_uuid: str) -> dict[str, str]:
+        """
+        获取架构内实体类型名称到 uuid 的映射
+
+        :param db: 异步数据库会话
+        :param schema_graph_uuid: 架构 uuid
+        :return: 映射字典
+        """
+        stmt = select(self.model.name, self.model.uuid).where(self.model.schema_graph_uuid == schema_graph_uuid)
+        result = await db.execute(stmt)
+        return dict(result.tuples().all())
+
     async def update(self, db: AsyncSession, schema_entity_id: int, obj: UpdateSchemaEntityParam) -> int:
         """
         更新实体类型
@@ -1,13 +1,15 @@
 from __future__ import annotations
-from sqlalchemy import and_, select
+from sqlalchemy import and_, insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from sqlalchemy_crud_plus import CRUDPlus
 from sqlalchemy import delete
 
 from backend.app.recommendation.model import SchemaRelationship
+from backend.app.recommendation.model.base import uuid4_str
 from backend.app.recommendation.schema.schema_relationship import AddSchemaRelationshipParam, \
     UpdateSchemaRelationshipParam
+from backend.utils.timezone import timezone
 
 
 class CRUDSchemaRelationship(CRUDPlus[SchemaRelationship]):
@@ -54,6 +56,34 @@ class CRUDSchemaRelationship(CRUDPlus[SchemaRelationship]):
         db.add(new_schema_relationship)
         return new_schema_relationship.uuid
 
+    async def bulk_create(self, db: AsyncSession, objs: list[AddSchemaRelationshipParam]) -> list[str]:
+        """
+        多行插入关系类型
+
+        :param db: 异步数据库会话
+        :param objs: 关系类型数据对象列表
+        :return: 与 objs 顺序一致的关系类型 uuid 列表
+        """
+        if not objs:
+            return []
+        now = timezone.now()
+        rows = [{**obj.model_dump(), 'uuid': uuid4_str(), 'created_time': now} for obj in objs]
+        await db.execute(insert(self.model), rows)
+        return [row['uuid'] for row in rows]
+
+    async def get_keys(self, db: AsyncSession, schema_graph_uuid: str) -> set[tuple[str, str, str]]:
+        """
+        获取架构内已有关系类型的 (头实体类型 uuid, 尾实体类型 uuid, 关系名称) 集合
+
+        :param db: 异步数据库会话
+        :param schema_graph_uuid: 架构 uuid
+        :return: 关系键集合
+        """
+        stmt = select(self.model.source_entity_uuid, self.model.target_entity_uuid, self.model.name).where(
+            self.model.schema_graph_uuid == schema_graph_uuid)
+        result = await db.execute(stmt)
+        return set(result.tuples().all())
+
     async def update(self, db: AsyncSession, schema_relationship_id: int, obj: UpdateSchemaRelationshipParam) -> int:
         """
         更新实体类型
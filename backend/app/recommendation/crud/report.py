@@ -1,6 +1,6 @@
 from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, delete
 from typing import List, Optional
 from uuid import UUID
 
@@ -78,4 +78,21 @@ class CRUDReport:
         result = await db.execute(stmt)
         return result.scalars().all()
 
+    async def update_async(
+        self, db: AsyncSession, *, db_obj: Report, obj_in: ReportUpdate
+    ) -> Report:
+        update_data = obj_in.dict(exclude_unset=True)
+        for field, value in update_data.items():
+            setattr(db_obj, field, value)
+        db.add(db_obj)
+        await db.flush()
+        return db_obj
+
+    async def delete_by_uuids_async(self, db: AsyncSession, *, uuids: List[str]) -> int:
+        if not uuids:
+            return 0
+        stmt = delete(Report).where(Report.uuid.in_(uuids))
+        result = await db.execute(stmt)
+        return result.rowcount
+
 report_dao = CRUDReport()
\ No newline at end of file
@@ -1,6 +1,6 @@
 from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, delete
 from typing import List, Optional
 from uuid import UUID
 import json
@@ -79,4 +79,11 @@ class CRUDReportEmbedding:
         result = await db.execute(stmt)
         return result.scalars().all()
 
+    async def delete_by_report_uuids_async(self, db: AsyncSession, *, report_uuids: List[str]) -> int:
+        if not report_uuids:
+            return 0
+        stmt = delete(ReportEmbedding).where(ReportEmbedding.report_uuid.in_(report_uuids))
+        result = await db.execute(stmt)
+        return result.rowcount
+
 report_embedding_dao = CRUDReportEmbedding()
\ No newline at end of file
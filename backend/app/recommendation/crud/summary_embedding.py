@@ -1,6 +1,6 @@
 from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, delete
 from typing import List, Optional
 from uuid import UUID
 import json
@@ -76,4 +76,11 @@ class CRUDSummaryEmbedding:
         result = await db.execute(stmt)
         return result.scalars().all()
 
+    async def delete_by_video_summary_uuids_async(self, db: AsyncSession, *, video_summary_uuids: List[str]) -> int:
+        if not video_summary_uuids:
+            return 0
+        stmt = delete(SummaryEmbedding).where(SummaryEmbedding.video_summary_uuid.in_(video_summary_uuids))
+        result = await db.execute(stmt)
+        return result.rowcount
+
 summary_embedding_dao = CRUDSummaryEmbedding()
\ No newline at end of file
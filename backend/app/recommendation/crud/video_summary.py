@@ -1,6 +1,6 @@
 from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, delete
 from typing import List, Optional
 from uuid import UUID
 
@@ -78,4 +78,11 @@ class CRUDVideoSummary:
         result = await db.execute(stmt)
         return result.scalars().all()
 
+    async def delete_by_uuids_async(self, db: AsyncSession, *, uuids: List[str]) -> int:
+        if not uuids:
+            return 0
+        stmt = delete(VideoSummary).where(VideoSummary.uuid.in_(uuids))
+        result = await db.execute(stmt)
+        return result.rowcount
+
 video_summary_dao = CRUDVideoSummary()
\ No newline at end of file
@@ -1,5 +1,6 @@
 from .base import Base
 from .course import Course
+from .course_dialogue import CourseDialogue
 from .video_summary import VideoSummary
 from .summary_embedding import SummaryEmbedding
 from .report import Report
@@ -16,6 +17,7 @@ from .embedding import Embedding
 __all__ = [
     "Base",
     "Course", 
+    "CourseDialogue",
     "VideoSummary",
     "SummaryEmbedding",
     "Report",
@@ -25,7 +25,8 @@ class Course(Base):
     learning_objectives: Mapped[str | None] = mapped_column(Text, nullable=True, default=None)
     learning_style_preference: Mapped[str | None] = mapped_column(String(100), nullable=True, default=None)
     knowledge_level_self_assessment: Mapped[str | None] = mapped_column(String(100), nullable=True, default=None)
-    dialogue: Mapped[list | None] = mapped_column(JSON, nullable=True, default=list)
+    dialogue_hash: Mapped[str | None] = mapped_column(String(64), nullable=True, default=None)
+    chunk_hashes: Mapped[list | None] = mapped_column(JSON, nullable=True, default=list)
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -46,6 +47,13 @@ class Course(Base):
         back_populates="course",
         cascade="all, delete-orphan"
     )
+    # 完整对话单独压缩存储，查询课程时不加载
+    dialogue_blob: Mapped['CourseDialogue'] = relationship(
+        "CourseDialogue",
+        back_populates="course",
+        cascade="all, delete-orphan",
+        uselist=False
+    )
     
     def __repr__(self):
         return f"<Course(course_id='{self.course_id}', resource_name='{self.resource_name}')>"
\ No newline at end of file
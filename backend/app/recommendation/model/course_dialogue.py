@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+from sqlalchemy import String, Integer, ForeignKey, DateTime
+from sqlalchemy.dialects.mysql import LONGBLOB
+from sqlalchemy.orm import relationship, Mapped, mapped_column
+from datetime import datetime
+
+from backend.common.model import MappedBase as Base
+
+
+class CourseDialogue(Base):
+    """课程对话表，zstd 压缩存储完整对话，仅在入库和图谱提取时按需加载"""
+    __tablename__ = 'course_dialogues'
+
+    course_uuid: Mapped[str] = mapped_column(String(36), ForeignKey('courses.uuid'), primary_key=True)
+    dialogue_zstd: Mapped[bytes] = mapped_column(LONGBLOB, nullable=False)
+    raw_size: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # 关系
+    course: Mapped['Course'] = relationship("Course", back_populates="dialogue_blob")
+
+    def __repr__(self):
+        return f"<CourseDialogue(course_uuid='{self.course_uuid}', raw_size={self.raw_size})>"
@@ -24,6 +24,7 @@ class KnowledgeGraph(Base):
     schema_graph_uuid: Mapped[str] = mapped_column(ForeignKey('schema_graph.uuid'), nullable=False)
     index_status: Mapped[str] = mapped_column(String(50), nullable=False, default='0', comment='Index Status')
     depth: Mapped[int] = mapped_column(Integer, nullable=False, default=0, comment='Depth')
+    extraction_mode: Mapped[str] = mapped_column(String(20), nullable=False, default='chain', comment='Extraction Mode(chain/fused)')
     schema_graph: Mapped['SchemaGraph'] = relationship(
         'SchemaGraph',
         back_populates='knowledge_graphs',
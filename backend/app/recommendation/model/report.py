@@ -19,6 +19,7 @@ class Report(Base):
     duration: Mapped[str] = mapped_column(String(50), nullable=False)
     segment_topic: Mapped[str] = mapped_column(Text, nullable=False)
     key_points: Mapped[list] = mapped_column(JSON, nullable=False)
+    chunk_hashes: Mapped[list | None] = mapped_column(JSON, nullable=True, default=None)
     
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List
 from uuid import UUID
 from datetime import datetime
 
@@ -15,7 +15,8 @@ class CourseBase(BaseModel):
     learning_objectives: Optional[str] = Field(None, description="学习目标")
     learning_style_preference: Optional[str] = Field(None, description="学习方式偏好")
     knowledge_level_self_assessment: Optional[str] = Field(None, description="知识掌握程度自评")
-    dialogue: Optional[List[Dict[str, Any]]] = Field(default_factory=list, description="课程对话")
+    dialogue_hash: Optional[str] = Field(None, description="课程对话内容哈希")
+    chunk_hashes: Optional[List[str]] = Field(default_factory=list, description="课程对话分块哈希")
 
 class CourseCreate(CourseBase):
     pass
@@ -29,7 +30,8 @@ class CourseUpdate(BaseModel):
     learning_objectives: Optional[str] = None
     learning_style_preference: Optional[str] = None
     knowledge_level_self_assessment: Optional[str] = None
-    dialogue: Optional[List[str]] = None
+    dialogue_hash: Optional[str] = None
+    chunk_hashes: Optional[List[str]] = None
 
 class CourseResponse(CourseBase):
     uuid: UUID
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Dict, List
+from typing import Dict, List, Literal
 
 from pydantic import Field
 
@@ -13,6 +13,7 @@ class KnowledgeGraphBase(SchemaBase):
     name: str | None = Field("")
     course_id: str | None = Field("")
     schema_graph_uuid: str | None = Field("")
+    extraction_mode: Literal['chain', 'fused'] = Field('chain', description="提取模式：chain 分步提取，fused 单次融合提取")
 
 
 class KnowledgeGraphResponse(KnowledgeGraphBase):
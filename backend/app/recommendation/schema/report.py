@@ -10,13 +10,18 @@ class ReportBase(BaseModel):
     duration: str = Field(..., description="持续时间")
     segment_topic: str = Field(..., description="段落主题")
     key_points: List[str] = Field(..., description="关键点列表")
+    chunk_hashes: Optional[List[str]] = Field(None, description="段落覆盖的对话分块哈希")
 
 class ReportCreate(ReportBase):
     pass
 
 class ReportUpdate(BaseModel):
+    start_time: Optional[str] = None
+    end_time: Optional[str] = None
+    duration: Optional[str] = None
     segment_topic: Optional[str] = None
     key_points: Optional[List[str]] = None
+    chunk_hashes: Optional[List[str]] = None
 
 class ReportResponse(ReportBase):
     uuid: UUID
@@ -28,7 +28,8 @@ class CommunityService:
                 return 0
 
             # 检查更新的名称是否已存在
-            if obj.title == community.title and obj.content == community.content and obj.rating == community.rating:
+            if obj.title == community.title and obj.content == community.content and obj.rating == community.rating \
+                    and obj.attributes == community.attributes:
                 return 0
 
             count = await community_dao.update_community(db, community.id, obj)
@@ -79,6 +80,20 @@ class CommunityService:
             #     await redis_client.delete_prefix(key)
             return count
 
+    @staticmethod
+    async def apply_changes(*, deleted: list[str], attributes: dict[str, str]) -> int:
+        """
+        增量构建索引时删除失效的社区，并更新报告保留但签名变化的社区属性
+
+        :param deleted: 待删除的社区 uuid
+        :param attributes: 社区 uuid 到新属性文本的映射
+        :return: 删除的社区数
+        """
+        async with async_db_session.begin() as db:
+            count = await community_dao.delete_by_uuids(db, deleted)
+            await community_dao.bulk_update_attributes(db, attributes)
+            return count
+
     @staticmethod
     async def get_all(*,kg_base_uuid: str, name: str = None) -> list[Community]:
         async with async_db_session() as db:
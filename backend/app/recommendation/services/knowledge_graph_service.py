@@ -2,17 +2,23 @@
 # -*- coding: utf-8 -*-
 import json
 import os
-from typing import List
-import asyncio
+from collections import Counter
+
 import pandas as pd
 
 from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend.app.recommendation.crud.course_dialogue import course_dialogue_dao
+from backend.app.recommendation.crud.crud_knowledge_entity import knowledge_entity_dao
 from backend.app.recommendation.crud.crud_knowledge_graph import knowledge_graph_dao
+from backend.app.recommendation.crud.crud_knowledge_relationship import knowledge_relationship_dao
 from backend.app.recommendation.model import KnowledgeGraph
 from backend.app.recommendation.schema import GetSchemaGraphDetail, GetIndexDetail
+from backend.app.recommendation.schema.knowledge_entity import AddKnowledgeEntityParam
 from backend.app.recommendation.schema.knowledge_graph import KnowledgeGraphBase, UpdateKnowledgeGraphParam
-from backend.common.core.unigraph.interface.kg_services import create_kg
+from backend.app.recommendation.schema.knowledge_relationship import AddKnowledgeRelationshipParam
+from backend.common.core.unigraph.interface.kg_services import iter_create_kg, resolve_entities
 from backend.common.core.unigraph.interface.query_service import build_index, query_kg
 from backend.common.core.unigraph.implementation.module.sapperrag.model.model_load import load_entities, load_community, \
     load_relationships
@@ -20,13 +26,32 @@ from backend.common.core.unigraph.implementation.module.sapperrag.utils import p
 from backend.common.exception.exception import errors
 from backend.core.logging import logger
 from backend.database.db_mysql import async_db_session
+from backend.utils.keyed_lock import KeyedLock
 
 PERMANENT_TEMP_DIR = "temp_files"
 os.makedirs(PERMANENT_TEMP_DIR, exist_ok=True)
 
 
+def _merge_source(kept_source: str | None, source: str | None) -> str:
+    """按行合并溯源文本，已存在的行不重复追加"""
+    spans = [span for span in (kept_source or '').split('\n') if span]
+    for span in (source or '').split('\n'):
+        if span and span not in spans:
+            spans.append(span)
+    return '\n'.join(spans)
+
+
+def _parse_attributes(attributes: str | None) -> dict:
+    """解析以 JSON 文本保存的属性，旧数据、空值或无法解析时返回空字典"""
+    try:
+        value = json.loads(attributes or '{}')
+    except json.JSONDecodeError:
+        return {}
+    return value if isinstance(value, dict) else {}
+
+
 class KnowledgeGraphService:
-    _lock = asyncio.Lock()  # 创建一个类级别的异步锁
+    _graph_lock = KeyedLock()  # 同一图谱的提取互斥，不同图谱可并行提取
 
     @staticmethod
     async def add(*, obj: KnowledgeGraphBase) -> str:
@@ -65,6 +90,12 @@ class KnowledgeGraphService:
             return knowledge_graph
 
 
+    @staticmethod
+    async def get_course_dialogue(*, course_id: str) -> list | None:
+        """按需加载已入库课程的完整对话"""
+        async with async_db_session() as db:
+            return await course_dialogue_dao.get_dialogue_by_course_id_async(db, course_id=course_id)
+
     @staticmethod
     async def get_depth(*, uuid: str = None) -> int:
         async with async_db_session() as db:
@@ -92,72 +123,296 @@ class KnowledgeGraphService:
             return knowledge_graphs
 
     @staticmethod
-    async def extract(
-            *,
-            text_data: str,
-            schema: GetSchemaGraphDetail
-    ) -> List[KnowledgeGraph]:
-        async with KnowledgeGraphService._lock:  # 使用异步锁确保同一时间只有一个请求被发送
-
-            entities = schema.entities
-            relationships = schema.relationships
-            entity_map = {entity.uuid: entity for entity in entities}
-
-            formed_schema = []
-            formed_schema_definition = {}
-
-            for relationship in relationships:
-                source_entity = entity_map.get(relationship.source_entity_uuid)
-                target_entity = entity_map.get(relationship.target_entity_uuid)
-
-                if not source_entity or not target_entity:
-                    continue
-
-                schema_entry = {
-                    "schema": {
-                        "DirectionalEntityType": {
-                            "Name": source_entity.name,
-                            "Attributes": source_entity.attributes
-                        },
-                        "RelationType": relationship.name,
-                        "DirectedEntityType": {
-                            "Name": target_entity.name,
-                            "Attributes": target_entity.attributes
-                        }
+    def form_schema(schema: GetSchemaGraphDetail) -> tuple[list, dict]:
+        """将知识架构转换为提取所需的类型三元组列表和类型定义字典"""
+        entities = schema.entities
+        relationships = schema.relationships
+        entity_map = {entity.uuid: entity for entity in entities}
+
+        formed_schema = []
+        formed_schema_definition = {}
+
+        for relationship in relationships:
+            source_entity = entity_map.get(relationship.source_entity_uuid)
+            target_entity = entity_map.get(relationship.target_entity_uuid)
+
+            if not source_entity or not target_entity:
+                continue
+
+            schema_entry = {
+                "schema": {
+                    "DirectionalEntityType": {
+                        "Name": source_entity.name,
+                        "Attributes": source_entity.attributes
+                    },
+                    "RelationType": relationship.name,
+                    "DirectedEntityType": {
+                        "Name": target_entity.name,
+                        "Attributes": target_entity.attributes
                     }
                 }
+            }
+
+            formed_schema_definition[relationship.name] = relationship.definition
+            formed_schema_definition[source_entity.name] = source_entity.definition
+            formed_schema_definition[target_entity.name] = target_entity.definition
+            formed_schema.append(schema_entry)
 
-                formed_schema_definition[relationship.name] = relationship.definition
-                formed_schema_definition[source_entity.name] = source_entity.definition
-                formed_schema_definition[target_entity.name] = target_entity.definition
-                formed_schema.append(schema_entry)
+        return formed_schema, formed_schema_definition
 
-            # 调用内部服务函数
-            api_result = await create_kg(
-                kg_schema=formed_schema,
-                text_data=text_data,
-                schema_definition=formed_schema_definition,
+    @staticmethod
+    async def extract_and_save(
+            *,
+            knowledge_graph_uuid: str,
+            text_data: list,
+            schema: GetSchemaGraphDetail,
+            extraction_mode: str = "chain",
+            batch_size: int = 200,
+    ) -> dict:
+        """
+        流式提取并写入：分块提取完成后即进入写入缓冲，累计满 batch_size 个三元组就提交一批，
+        已完成分块的结果无需等待最慢的分块即可持久化。全部分块写入后，对已入库的实体做一次跨分块实体消解
+
+        :param knowledge_graph_uuid: 图谱 uuid
+        :param text_data: 待提取的对话
+        :param schema: 模式图谱
+        :param extraction_mode: 提取模式
+        :param batch_size: 每批写入的三元组数量
+        :return: 新增实体数、新增关系数、补充溯源的关系数与消解合并的实体数
+        """
+        stats = {"entities": 0, "relationships": 0, "updated_relationships": 0, "merged_entities": 0}
+        # LLM 并发由全局 llm_limiter 统一限制，这里只保证同一图谱不会被并发提取
+        async with KnowledgeGraphService._graph_lock(knowledge_graph_uuid):
+            formed_schema, formed_schema_definition = KnowledgeGraphService.form_schema(schema)
+            async with async_db_session() as db:
+                uuid_map = await knowledge_entity_dao.get_uuid_map(db, knowledge_graph_uuid)
+                relationship_sources = await knowledge_relationship_dao.get_source_map(db, knowledge_graph_uuid)
+
+            buffer, buffered = [], 0
+            new_entity_types = set()
+
+            async def flush():
+                nonlocal buffer, buffered
+                if not buffer:
+                    return
+                async with async_db_session.begin() as db:
+                    batch_stats, new_entities, new_sources = await KnowledgeGraphService._upsert_triples(
+                        db,
+                        knowledge_graph_uuid=knowledge_graph_uuid,
+                        knowledge_graph_data_all=buffer,
+                        uuid_map=uuid_map,
+                        relationship_sources=relationship_sources,
+                    )
+                # 批次提交成功后才合并映射，回滚的批次不会让后续批次引用未写入的实体和关系
+                uuid_map.update(new_entities)
+                relationship_sources.update(new_sources)
+                new_entity_types.update(type_ for _, type_ in new_entities)
+                for key, value in batch_stats.items():
+                    stats[key] += value
+                buffer, buffered = [], 0
+
+            async for knowledge_graph_data in iter_create_kg(
+                    kg_schema=formed_schema,
+                    schema_definition=formed_schema_definition,
+                    text_data=text_data,
+                    extraction_mode=extraction_mode,
+            ):
+                buffer.append(knowledge_graph_data)
+                buffered += len(knowledge_graph_data['semantic_kg'])
+                if buffered >= batch_size:
+                    await flush()
+            await flush()
+
+            stats["merged_entities"] = await KnowledgeGraphService._resolve_entities(
+                knowledge_graph_uuid=knowledge_graph_uuid,
+                entity_types=new_entity_types,
             )
+        return stats
 
-            return api_result
+    @staticmethod
+    async def _upsert_triples(
+            db: AsyncSession,
+            *,
+            knowledge_graph_uuid: str,
+            knowledge_graph_data_all: list,
+            uuid_map: dict,
+            relationship_sources: dict,
+    ) -> tuple[dict, dict, dict]:
+        """
+        写入一批三元组：新实体与新关系多行插入，已有关系只补充新的溯源文本
+
+        uuid_map 与 relationship_sources 不会被修改，本批次的变更单独返回，由调用方在事务提交后合并
+
+        :param db: 异步数据库会话
+        :param knowledge_graph_uuid: 图谱 uuid
+        :param knowledge_graph_data_all: iter_create_kg 格式的提取结果
+        :param uuid_map: (实体名称, 实体类型) 到实体 uuid 的映射
+        :param relationship_sources: 关系键到 (关系 uuid, 溯源文本) 的映射
+        :return: 统计（新增实体数、新增关系数与补充溯源的关系数）、本批次新增的实体映射、本批次新增或更新的关系映射
+        """
+        entity_params: dict[tuple[str, str], AddKnowledgeEntityParam] = {}
+        triples = []
+        for knowledge_graph_data in knowledge_graph_data_all:
+            # 转换三元组源哈希表
+            triple_source_hash_table_ = {item['ID']: item['TripleSource'] for item in knowledge_graph_data['triple_source']}
+
+            for triple in knowledge_graph_data['semantic_kg']:
+                entity_keys = []
+                for entity in (triple.get('DirectionalEntity'), triple.get('DirectedEntity')):
+                    if not entity or not entity.get('Name'):
+                        entity_keys.append(None)
+                        continue
+                    key = (entity.get('Name'), entity.get('Type'))
+                    # 同名同类型实体只保留首次出现的属性
+                    if key not in uuid_map and key not in entity_params:
+                        entity_params[key] = AddKnowledgeEntityParam(
+                            knowledge_graph_uuid=knowledge_graph_uuid,
+                            name=entity.get('Name'),
+                            type=entity.get('Type'),
+                            attributes=json.dumps(entity.get('Attributes'))
+                        )
+                    entity_keys.append(key)
+
+                relation = triple.get('Relation')
+                if relation and all(entity_keys):
+                    triples.append((*entity_keys, relation, triple_source_hash_table_.get(triple.get('ID'), '')))
+
+        new_keys = list(entity_params)
+        new_uuids = await knowledge_entity_dao.bulk_create(db, [entity_params[key] for key in new_keys])
+        new_entities = dict(zip(new_keys, new_uuids))
+
+        def entity_uuid(key):
+            return new_entities[key] if key in new_entities else uuid_map[key]
+
+        relationships: dict[tuple[str, str, str], AddKnowledgeRelationshipParam] = {}
+        new_sources = {}
+        updated_sources = {}
+        for source_key, target_key, relation, source in triples:
+            relationship_key = (entity_uuid(source_key), entity_uuid(target_key), relation.get('Name'))
+            if relationship_key in relationships:
+                # 本批次内重复的关系：合并溯源文本
+                relationships[relationship_key].source = _merge_source(relationships[relationship_key].source, source)
+                continue
+            if relationship_key in relationship_sources:
+                # 已入库的关系：只追加尚未记录的溯源文本
+                uuid, kept_source = new_sources.get(relationship_key) or relationship_sources[relationship_key]
+                merged_source = _merge_source(kept_source, source)
+                if merged_source != (kept_source or ''):
+                    new_sources[relationship_key] = (uuid, merged_source)
+                    updated_sources[uuid] = merged_source
+                continue
+            relationships[relationship_key] = AddKnowledgeRelationshipParam(
+                knowledge_graph_uuid=knowledge_graph_uuid,
+                source_entity_uuid=relationship_key[0],
+                target_entity_uuid=relationship_key[1],
+                name=relation.get('Name'),
+                attributes='{}',
+                type=relation.get('Type'),
+                source=source
+            )
+        new_relationship_uuids = await knowledge_relationship_dao.bulk_create(db, list(relationships.values()))
+        for (key, relationship), uuid in zip(relationships.items(), new_relationship_uuids):
+            new_sources[key] = (uuid, relationship.source)
+        await knowledge_relationship_dao.bulk_update_source(db, updated_sources)
 
+        stats = {"entities": len(new_keys), "relationships": len(relationships), "updated_relationships": len(updated_sources)}
+        return stats, new_entities, new_sources
+
+    @staticmethod
+    async def _resolve_entities(*, knowledge_graph_uuid: str, entity_types: set) -> int:
+        """
+        对已入库的实体做跨分块实体消解：被合并实体的关系改指向规范实体，合并后重复的关系只保留最早的一条并合并溯源文本，
+        合并后首尾相同的关系删除，规范实体缺失的属性由被合并实体补全
+
+        :param knowledge_graph_uuid: 图谱 uuid
+        :param entity_types: 本次提取新增了实体的类型，只在这些类型内消解
+        :return: 合并的实体数
+        """
+        if not entity_types:
+            return 0
+        async with async_db_session() as db:
+            entities = await knowledge_entity_dao.get_list(db, knowledge_graph_uuid=knowledge_graph_uuid)
+            relationships = await knowledge_relationship_dao.get_list(db, knowledge_graph_uuid=knowledge_graph_uuid)
+
+        entities = {entity.uuid: entity for entity in entities if entity.type in entity_types}
+        keys = {uuid: (entity.type, entity.name) for uuid, entity in entities.items()}
+        occurrences = Counter()
+        for relationship in relationships:
+            for uuid in (relationship.source_entity_uuid, relationship.target_entity_uuid):
+                if uuid in keys:
+                    occurrences[keys[uuid]] += 1
+
+        # 嵌入请求在事务外完成，图谱锁保证期间没有其他写入
+        canonical = await resolve_entities(
+            {key: _parse_attributes(entities[uuid].attributes) for uuid, key in keys.items()}, occurrences)
+        if not canonical:
+            return 0
+
+        uuid_of = {key: uuid for uuid, key in keys.items()}
+        merged = {uuid_of[key]: uuid_of[(key[0], target)] for key, target in canonical.items()}
+
+        attributes = {}
+        for uuid, target in merged.items():
+            kept = attributes.get(target) or _parse_attributes(entities[target].attributes)
+            filled = {key: value for key, value in _parse_attributes(entities[uuid].attributes).items()
+                      if kept.get(key) in (None, '', 'None', 'Unknown')}
+            if filled:
+                attributes[target] = {**kept, **filled}
+
+        kept_relationships, sources, endpoints, deleted = {}, {}, {}, []
+        for relationship in relationships:
+            source_uuid = merged.get(relationship.source_entity_uuid, relationship.source_entity_uuid)
+            target_uuid = merged.get(relationship.target_entity_uuid, relationship.target_entity_uuid)
+            moved = (source_uuid, target_uuid) != (relationship.source_entity_uuid, relationship.target_entity_uuid)
+            if moved and source_uuid == target_uuid:
+                deleted.append(relationship.uuid)
+                continue
+            key = (source_uuid, target_uuid, relationship.name)
+            if key not in kept_relationships:
+                kept_relationships[key] = relationship.uuid
+                sources[relationship.uuid] = relationship.source
+                if moved:
+                    endpoints[relationship.uuid] = (source_uuid, target_uuid, relationship.source)
+                continue
+            kept_uuid = kept_relationships[key]
+            sources[kept_uuid] = _merge_source(sources[kept_uuid], relationship.source)
+            endpoints[kept_uuid] = (source_uuid, target_uuid, sources[kept_uuid])
+            deleted.append(relationship.uuid)
+
+        async with async_db_session.begin() as db:
+            await knowledge_relationship_dao.delete_by_uuids(db, deleted)
+            await knowledge_relationship_dao.bulk_update_endpoints(db, endpoints)
+            await knowledge_entity_dao.bulk_update_attributes(
+                db, {uuid: json.dumps(value) for uuid, value in attributes.items()})
+            await knowledge_entity_dao.delete_by_uuids(db, list(merged))
+        logger.info(f"图谱 {knowledge_graph_uuid} 实体消解: 合并实体 {len(merged)} 个，删除关系 {len(deleted)} 条")
+        return len(merged)
 
     @staticmethod
     async def build_index(
             *,
             knowledge_graph: GetIndexDetail,
             level: int,
+            incremental: bool = True,
     ):
         entities = [entity.to_dict() for entity in knowledge_graph.entities]
         relationships = [relationship.to_dict() for relationship in knowledge_graph.relationships]
+        # 上次构建的社区用于增量划分，以及沿用输入内容未变化的社区报告
+        previous_communities = [
+            {"id": community.uuid, "level": community.level, "title": community.title, "content": community.content,
+             "rating": community.rating, "attributes": _parse_attributes(community.attributes)}
+            for community in knowledge_graph.communities
+        ]
 
         try:
-            entities, community_reports = await build_index(
+            entities, community_reports, community_plan = await build_index(
                 entities=entities,
                 relationships=relationships,
                 level=level - 1,
+                previous_communities=previous_communities,
+                incremental=incremental,
             )
-            return {"entities": entities, "community_reports": community_reports}
+            return {"entities": entities, "community_reports": community_reports, "community_plan": community_plan}
 
         except Exception as e:
             logger.error(f"An error occurred: {str(e)}", exc_info=True)
@@ -209,3 +464,4 @@ class KnowledgeGraphService:
 
 
 knowledge_graph_service = KnowledgeGraphService()
+
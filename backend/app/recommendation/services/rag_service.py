@@ -1,24 +1,39 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-from typing import List, Dict, Any
+import asyncio
+from typing import List, Dict, Any, Iterable, AsyncIterable, AsyncIterator
 
 from sklearn.metrics.pairwise import cosine_similarity
 
 from backend.app.recommendation.crud.course import course_dao
+from backend.app.recommendation.crud.course_dialogue import course_dialogue_dao
 from backend.app.recommendation.crud.report import report_dao
 from backend.app.recommendation.crud.report_embedding import report_embedding_dao
 from backend.app.recommendation.crud.summary_embedding import summary_embedding_dao
 from backend.app.recommendation.crud.video_summary import video_summary_dao
 from backend.app.recommendation.schema import CourseCreate, CourseUpdate, VideoSummaryCreate, SummaryEmbeddingCreate, \
-    ReportCreate, ReportEmbeddingCreate
+    ReportCreate, ReportUpdate, ReportEmbeddingCreate
 from backend.common.core.llm.response_getter import GenericResponseGetter
 from backend.common.core.rag.build_index.dialogue_process.dialogue_process import DialogueProcessor
+from backend.common.core.rag.build_index.dialogue_process.report_merge import sort_reports
 from backend.database.db_mysql import async_db_session
 import json
 import numpy as np
 
 
 
+async def _aenumerate(items: Iterable | AsyncIterable) -> AsyncIterator[tuple[int, Any]]:
+    """同时支持同步与异步可迭代对象的 enumerate"""
+    if isinstance(items, AsyncIterable):
+        index = 0
+        async for item in items:
+            yield index, item
+            index += 1
+    else:
+        for index, item in enumerate(items):
+            yield index, item
+
+
 class RagService:
     """
     提供RAG(检索增强生成)相关的数据处理服务
@@ -29,12 +44,14 @@ class RagService:
         self.dialogue_processor = DialogueProcessor()
     
     @staticmethod
-    async def process_course_data(*, course_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    async def process_course_data(
+        *, course_data: Iterable[Dict[str, Any]] | AsyncIterable[Dict[str, Any]]
+    ) -> Dict[str, Any]:
         """
         处理课程数据
         
         Args:
-            course_data: 课程数据列表
+            course_data: 课程数据列表，也可以是逐条产出课程数据的(异步)生成器
             
         Returns:
             处理结果统计
@@ -42,17 +59,24 @@ class RagService:
         service = RagService()
         
         results = {
-            "total_items": len(course_data),
+            "total_items": 0,
             "processed_items": 0,
             "failed_items": 0,
+            "removed_segments": 0,
+            "saved_embedding_calls": 0,
+            "regenerated_chunks": 0,
+            "reused_chunks": 0,
             "errors": []
         }
         
-        for index, item in enumerate(course_data):
+        async for index, item in _aenumerate(course_data):
+            results["total_items"] += 1
             try:
                 print("已完成:", index)
-                await service._process_single_course(item)
+                course_stats = await service._process_single_course(item)
                 results["processed_items"] += 1
+                for key, value in (course_stats or {}).items():
+                    results[key] = results.get(key, 0) + value
             except Exception as e:
                 results["failed_items"] += 1
                 results["errors"].append({
@@ -63,8 +87,8 @@ class RagService:
 
         return results
 
-    async def _process_single_course(self, item: Dict[str, Any]) -> None:
-        """处理单个课程数据"""
+    async def _process_single_course(self, item: Dict[str, Any]) -> Dict[str, int] | None:
+        """处理单个课程数据，课程已存在时增量重建，返回处理统计"""
         course_id = item.get("id")
         resource_name = item.get("class_name")
         version = item.get("version", "")
@@ -76,6 +100,11 @@ class RagService:
         dialogue = item.get("identification_result", [])
 
         async with async_db_session.begin() as db:
+            existing_course = await course_dao.find_by_course_id_async(db, course_id=course_id)
+            if existing_course:
+                return await self._reingest_course(db, course=existing_course, dialogue=dialogue)
+
+            dialogue_chunks = self.dialogue_processor.chunk_with_overlap(dialogue=dialogue)
             course_create = CourseCreate(
                 course_id=course_id,
                 resource_name=resource_name,
@@ -85,7 +114,8 @@ class RagService:
                 grade=grade,
                 subject=subject,
                 video_link=video_link,
-                dialogue=dialogue,
+                dialogue_hash=self.dialogue_processor.content_hash(dialogue),
+                chunk_hashes=[self.dialogue_processor.content_hash(chunk) for chunk in dialogue_chunks],
                 learning_objectives=None,
                 learning_style_preference=None,
                 knowledge_level_self_assessment=None
@@ -93,62 +123,163 @@ class RagService:
 
             course = await course_dao.create_async(db, obj_in=course_create)
             course_uuid = course.uuid
+            await course_dialogue_dao.save_async(db, course_uuid=course_uuid, dialogue=dialogue)
 
             # 处理对话数据
             if dialogue:
-                processed_result = await self.dialogue_processor.process(dialogue)
-                # 从label_with_embedding中提取字段更新course表
-                if processed_result.get("label_with_embedding"):
-                    labels = processed_result["label_with_embedding"]
-                    update_data = CourseUpdate(
-                        learning_objectives=labels.get("learning_objectives"),
-                        learning_style_preference=labels.get("learning_style_preference"),
-                        knowledge_level_self_assessment=labels.get("knowledge_level_self_assessment")
-                    )
-                    await course_dao.update_async(db, db_obj=course, obj_in=update_data)
-
-                # 处理label_with_embedding中的summary和summary_embedding，分别存入video_summary和summary_embedding表
-                if processed_result.get("label_with_embedding"):
-                    label_data = processed_result["label_with_embedding"]
-
-                    if "class_summary" in label_data:
-                        video_summary_create = VideoSummaryCreate(
-                            course_uuid=course_uuid,
-                            video_summary=label_data["class_summary"]
-                        )
-                        video_summary = await video_summary_dao.create_async(db, obj_in=video_summary_create)
-
-                        # 将summary_embedding存入summary_embedding表
-                        if "summary_embedding" in label_data:
-                            embedding_create = SummaryEmbeddingCreate(
-                                video_summary_uuid=video_summary.uuid,
-                                vector=label_data["summary_embedding"]
-                            )
-                            await summary_embedding_dao.create_async(db, obj_in=embedding_create)
-
-                # 处理report_with_embedding数据，存入report和report_embedding表
-                if processed_result.get("report_with_embedding"):
-                    reports = processed_result["report_with_embedding"]
-
-                    for report_data in reports:
-                        # 将report数据存入report表
-                        report_create = ReportCreate(
-                            course_uuid=course_uuid,
-                            start_time=report_data.get("start_time"),
-                            end_time=report_data.get("end_time"),
-                            duration=report_data.get("duration"),
-                            segment_topic=report_data.get("segment_topic"),
-                            key_points=report_data.get("key_points")
-                        )
-                        report = await report_dao.create_async(db, obj_in=report_create)
-
-                        # 将report_embedding存入report_embedding表
-                        if "segment_topic_embedding" in report_data:
-                            report_embedding_create = ReportEmbeddingCreate(
-                                report_uuid=report.uuid,
-                                vector=report_data["segment_topic_embedding"]
-                            )
-                            await report_embedding_dao.create_async(db, obj_in=report_embedding_create)
+                reports, label, merge_stats = await self.dialogue_processor.report_pipeline(chunks=dialogue_chunks)
+
+                # 摘要嵌入与报告入库并行执行
+                labels, _ = await asyncio.gather(
+                    self.dialogue_processor.label_embedding(label=label),
+                    self._save_reports(db, course_uuid=course_uuid, reports=reports),
+                )
+                await self._save_label(db, course=course, labels=labels)
+                return {**merge_stats, "regenerated_chunks": len(dialogue_chunks), "reused_chunks": 0}
+        return None
+
+    async def _reingest_course(self, db, *, course, dialogue: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        增量重建已存在的课程：只为内容变化的分块重新生成和嵌入报告，段落主题变化时才重新生成标签和摘要
+
+        :param db: 数据库会话
+        :param course: 已存在的课程
+        :param dialogue: 新的课程对话
+        :return: 处理统计
+        """
+        dialogue_hash = self.dialogue_processor.content_hash(dialogue)
+        if course.dialogue_hash == dialogue_hash:
+            return {"regenerated_chunks": 0, "reused_chunks": len(course.chunk_hashes or [])}
+
+        dialogue_chunks = self.dialogue_processor.chunk_with_overlap(dialogue=dialogue)
+        chunk_hashes = [self.dialogue_processor.content_hash(chunk) for chunk in dialogue_chunks]
+        new_hash_set = set(chunk_hashes)
+
+        # 报告覆盖的分块都未变化时保留，否则作废
+        old_reports = await report_dao.get_by_course_uuid_async(db, course_uuid=course.uuid, limit=None)
+        previous_topics = [report["segment_topic"] for report in sort_reports(
+            [{"start_time": r.start_time, "segment_topic": r.segment_topic} for r in old_reports])]
+        kept_reports, kept_models, stale_uuids = [], {}, []
+        for report in old_reports:
+            if report.chunk_hashes and set(report.chunk_hashes) <= new_hash_set:
+                kept_models[report.uuid] = report
+                kept_reports.append({
+                    "uuid": report.uuid,
+                    "start_time": report.start_time,
+                    "end_time": report.end_time,
+                    "duration": report.duration,
+                    "segment_topic": report.segment_topic,
+                    "key_points": list(report.key_points or []),
+                    "chunk_hashes": list(report.chunk_hashes),
+                })
+            else:
+                stale_uuids.append(report.uuid)
+
+        covered_hashes = {h for report in kept_reports for h in report["chunk_hashes"]}
+        changed_chunks = [chunk for chunk, h in zip(dialogue_chunks, chunk_hashes) if h not in covered_hashes]
+
+        reports, label, merge_stats = await self.dialogue_processor.report_pipeline(
+            chunks=changed_chunks,
+            existing_reports=kept_reports,
+            previous_topics=previous_topics,
+        )
+
+        await report_embedding_dao.delete_by_report_uuids_async(db, report_uuids=stale_uuids)
+        await report_dao.delete_by_uuids_async(db, uuids=stale_uuids)
+
+        # 已有报告吸收了新分块时更新，新段落直接入库
+        new_reports = []
+        for report_data in reports:
+            report = kept_models.get(report_data.get("uuid"))
+            if report is None:
+                new_reports.append(report_data)
+            elif report_data["chunk_hashes"] != report.chunk_hashes:
+                await report_dao.update_async(db, db_obj=report, obj_in=ReportUpdate(
+                    start_time=report_data["start_time"],
+                    end_time=report_data["end_time"],
+                    duration=report_data["duration"],
+                    key_points=report_data["key_points"],
+                    chunk_hashes=report_data["chunk_hashes"],
+                ))
+
+        if label is None:
+            await self._save_reports(db, course_uuid=course.uuid, reports=new_reports)
+        else:
+            labels, _ = await asyncio.gather(
+                self.dialogue_processor.label_embedding(label=label),
+                self._save_reports(db, course_uuid=course.uuid, reports=new_reports),
+            )
+            # 段落主题发生变化，替换旧的摘要及其嵌入
+            video_summaries = await video_summary_dao.get_by_course_uuid_async(db, course_uuid=course.uuid)
+            video_summary_uuids = [video_summary.uuid for video_summary in video_summaries]
+            await summary_embedding_dao.delete_by_video_summary_uuids_async(db, video_summary_uuids=video_summary_uuids)
+            await video_summary_dao.delete_by_uuids_async(db, uuids=video_summary_uuids)
+            await self._save_label(db, course=course, labels=labels)
+
+        await course_dialogue_dao.save_async(db, course_uuid=course.uuid, dialogue=dialogue)
+        await course_dao.update_async(db, db_obj=course, obj_in=CourseUpdate(
+            dialogue_hash=dialogue_hash,
+            chunk_hashes=chunk_hashes,
+        ))
+        return {
+            **merge_stats,
+            "regenerated_chunks": len(changed_chunks),
+            "reused_chunks": len(dialogue_chunks) - len(changed_chunks),
+        }
+
+    @staticmethod
+    async def _save_label(db, *, course, labels: Dict[str, Any]) -> None:
+        """将label_with_embedding存入course、video_summary和summary_embedding表"""
+        if not labels:
+            return
+
+        # 从label_with_embedding中提取字段更新course表
+        update_data = CourseUpdate(
+            learning_objectives=labels.get("learning_objectives"),
+            learning_style_preference=labels.get("learning_style_preference"),
+            knowledge_level_self_assessment=labels.get("knowledge_level_self_assessment")
+        )
+        await course_dao.update_async(db, db_obj=course, obj_in=update_data)
+
+        # 处理label_with_embedding中的summary和summary_embedding，分别存入video_summary和summary_embedding表
+        if "class_summary" in labels:
+            video_summary_create = VideoSummaryCreate(
+                course_uuid=course.uuid,
+                video_summary=labels["class_summary"]
+            )
+            video_summary = await video_summary_dao.create_async(db, obj_in=video_summary_create)
+
+            # 将summary_embedding存入summary_embedding表
+            if "summary_embedding" in labels:
+                embedding_create = SummaryEmbeddingCreate(
+                    video_summary_uuid=video_summary.uuid,
+                    vector=labels["summary_embedding"]
+                )
+                await summary_embedding_dao.create_async(db, obj_in=embedding_create)
+
+    @staticmethod
+    async def _save_reports(db, *, course_uuid: str, reports: List[Dict[str, Any]]) -> None:
+        """将report_with_embedding数据存入report和report_embedding表"""
+        for report_data in reports:
+            # 将report数据存入report表
+            report_create = ReportCreate(
+                course_uuid=course_uuid,
+                start_time=report_data.get("start_time"),
+                end_time=report_data.get("end_time"),
+                duration=report_data.get("duration"),
+                segment_topic=report_data.get("segment_topic"),
+                key_points=report_data.get("key_points"),
+                chunk_hashes=report_data.get("chunk_hashes")
+            )
+            report = await report_dao.create_async(db, obj_in=report_create)
+
+            # 将report_embedding存入report_embedding表
+            if "segment_topic_embedding" in report_data:
+                report_embedding_create = ReportEmbeddingCreate(
+                    report_uuid=report.uuid,
+                    vector=report_data["segment_topic_embedding"]
+                )
+                await report_embedding_dao.create_async(db, obj_in=report_embedding_create)
 
     @staticmethod
     async def ask_recommendation(*, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
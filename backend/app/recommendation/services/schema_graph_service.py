@@ -1,22 +1,26 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import json
 import os
 
-import asyncio
-
+from backend.app.recommendation.crud.crud_schema_entity import schema_entity_dao
 from backend.app.recommendation.crud.crud_schema_graph import schema_graph_dao
+from backend.app.recommendation.crud.crud_schema_relationship import schema_relationship_dao
 from backend.app.recommendation.model import SchemaGraph
+from backend.app.recommendation.schema.schema_entity import AddSchemaEntityParam
 from backend.app.recommendation.schema.schema_graph import SchemaGraphBase, UpdateSchemaGraphBase
+from backend.app.recommendation.schema.schema_relationship import AddSchemaRelationshipParam
 from backend.common.core.unigraph.interface.kgschema_service import create_schema
 from backend.common.exception.exception import errors
 from backend.database.db_mysql import async_db_session
+from backend.utils.keyed_lock import KeyedLock
 
 PERMANENT_TEMP_DIR = "temp_files"
 os.makedirs(PERMANENT_TEMP_DIR, exist_ok=True)
 
 
 class SchemaGraphService:
-    _lock = asyncio.Lock()  # 创建一个类级别的异步锁
+    _graph_lock = KeyedLock()  # 同一架构的构建互斥，不同架构可并行构建
 
     @staticmethod
     async def add(*, obj: SchemaGraphBase) -> str:
@@ -82,14 +86,94 @@ class SchemaGraphService:
             *,
             aim: str = None,
             text_data: str = None,
+            schema_uuid: str = None,
     ):
-        async with SchemaGraphService._lock:
+        # LLM 并发由全局 llm_limiter 统一限制，这里只保证同一架构不会被并发构建
+        async with SchemaGraphService._graph_lock(schema_uuid or aim or ""):
             schema, definition = await create_schema(
                 aim=aim,
                 text_data=text_data
             )
             return schema, definition
 
+    @staticmethod
+    async def save_schema(*, schema_uuid: str, schema: list, schema_definition: dict) -> dict:
+        """
+        批量写入提取的架构：实体类型按名称、关系类型按 (头实体类型, 尾实体类型, 关系名称) 在内存中去重，
+        实体类型和关系类型各一次多行插入，在同一事务内完成
+
+        :param schema_uuid: 架构 uuid
+        :param schema: create_schema 返回的架构列表
+        :param schema_definition: 类型定义字典
+        :return: 新增实体类型数与关系类型数
+        """
+        # 从架构中获取实体类型的source
+        entity_source = {}
+        # 从架构中得到关系类型的source
+        relation_source = {}
+        for item in schema:
+            directional_entity = item['schema']['DirectionalEntityType']['Name']
+            directed_entity = item['schema']['DirectedEntityType']['Name']
+            source_key = next(iter(item['source'].keys()))  # 获取 source 字典的第一个键
+            source_entities = source_key.strip('()').split(', ')  # 去掉括号并按逗号分割
+            entity_source.setdefault(directional_entity, []).append(source_entities[0])
+            entity_source.setdefault(directed_entity, []).append(source_entities[2])
+            relation_source.setdefault(item['schema']['RelationType'], {}).update(item['source'])
+
+        # 去重并保持顺序
+        for key in entity_source:
+            entity_source[key] = list(dict.fromkeys(entity_source[key]))
+
+        entity_params: dict[str, AddSchemaEntityParam] = {}
+        relationship_items = []
+        for item in schema:
+            item = item.get("schema")
+            entity_names = []
+            for entity in (item.get("DirectionalEntityType"), item.get("DirectedEntityType")):
+                if not entity:
+                    entity_names.append(None)
+                    continue
+                name = entity.get("Name")
+                # 同名实体类型只保留首次出现的属性
+                if name not in entity_params:
+                    entity_params[name] = AddSchemaEntityParam(
+                        schema_graph_uuid=schema_uuid,
+                        name=name,
+                        attributes=json.dumps(entity.get("Attributes")),
+                        definition=schema_definition.get(name),
+                        source=json.dumps(entity_source.get(name))
+                    )
+                entity_names.append(name)
+            relationship = item.get("RelationType")
+            if all(entity_names) and relationship:
+                relationship_items.append((*entity_names, relationship))
+
+        async with SchemaGraphService._graph_lock(schema_uuid), async_db_session.begin() as db:
+            uuid_map = await schema_entity_dao.get_uuid_map(db, schema_uuid)
+            new_names = [name for name in entity_params if name not in uuid_map]
+            new_uuids = await schema_entity_dao.bulk_create(db, [entity_params[name] for name in new_names])
+            uuid_map.update(zip(new_names, new_uuids))
+
+            relationship_keys = await schema_relationship_dao.get_keys(db, schema_uuid)
+            relationships = []
+            for source_name, target_name, relationship in relationship_items:
+                relationship_key = (uuid_map[source_name], uuid_map[target_name], relationship)
+                if relationship_key in relationship_keys:
+                    continue
+                relationship_keys.add(relationship_key)
+                relationships.append(AddSchemaRelationshipParam(
+                    target_entity_uuid=relationship_key[1],
+                    source_entity_uuid=relationship_key[0],
+                    schema_graph_uuid=schema_uuid,
+                    type=relationship,
+                    name=relationship,
+                    definition=schema_definition.get(relationship),
+                    source=json.dumps(relation_source.get(relationship))
+                ))
+            await schema_relationship_dao.bulk_create(db, relationships)
+
+        return {"entities": len(new_names), "relationships": len(relationships)}
+
 
 
 schema_graph_service = SchemaGraphService()
@@ -0,0 +1,24 @@
+import asyncio
+import os
+
+
+class LLMLimiter:
+    """
+    进程级 LLM 调用预算，所有对话与嵌入请求共享
+
+    各业务流程可以自由并行，真正同时在途的 LLM 请求数由这里统一限制
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._semaphore.release()
+
+
+llm_limiter = LLMLimiter(max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "32")))
@@ -1,5 +1,6 @@
 import asyncio
 import json
+from functools import lru_cache
 from typing import List
 
 import aiohttp
@@ -8,6 +9,19 @@ from openai import AsyncOpenAI
 from sklearn.metrics.pairwise import cosine_similarity
 
 from backend.common.core.llm.base import ResponseGetter
+from backend.common.core.llm.limiter import llm_limiter
+from backend.core.config import settings
+
+
+@lru_cache(maxsize=1)
+def _embedding_client() -> AsyncOpenAI:
+    """
+    向量嵌入共用的客户端，get_vector 与 get_vectors 都经由它调用，保证所有向量来自同一接口与模型。
+    API密钥与地址取自配置（API_KEY、BASE_URL），未配置时直接报错，不回退到 OPENAI_API_KEY 与官方地址
+    """
+    if not settings.API_KEY or not settings.BASE_URL:
+        raise RuntimeError("未配置 API_KEY 或 BASE_URL，无法调用向量嵌入接口")
+    return AsyncOpenAI(api_key=settings.API_KEY, base_url=settings.BASE_URL)
 
 
 class GenericResponseGetter(ResponseGetter):
@@ -83,21 +97,21 @@ class GenericResponseGetter(ResponseGetter):
         """
         # 初始化异步客户端
         async_client = AsyncOpenAI(api_key=api_key, base_url=base_url)
-        # async with semaphore:
-        completion = await async_client.chat.completions.create(
-            model=model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "你是对话概括专家。"
-                },
-                {
-                    "role": "user",
-                    "content": query
-                },
-            ],
-            temperature=0
-        )
+        async with llm_limiter:
+            completion = await async_client.chat.completions.create(
+                model=model,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "你是对话概括专家。"
+                    },
+                    {
+                        "role": "user",
+                        "content": query
+                    },
+                ],
+                temperature=0
+            )
         return completion.choices[0].message.content
 
     # @staticmethod
@@ -135,29 +149,35 @@ class GenericResponseGetter(ResponseGetter):
     @staticmethod
     async def get_vector(
             query: str,
-            model: str = "text-embedding-3-small",
-            api_key: str = "sk-xkuiviuxwYIBnGek385201B95d85415eA5A17bCe99CfCbB6",
-            base_url: str = "https://api.rcouyi.com/v1",
+            model: str | None = None,
     ) -> list[float]:
         """
-        向量嵌入API接口
+        向量嵌入API接口，与 get_vectors 共用同一客户端与模型配置
         :param query: 查询内容
-        :param model: 模型名称
-        :param api_key: API密钥
-        :param base_url: API地址
+        :param model: 模型名称，默认使用配置中的 EMBEDDING_MODEL
         """
+        vectors = await GenericResponseGetter.get_vectors([query], model=model)
+        return vectors[0]
 
-        # 初始化异步Embedding客户端
-        async_embedding_client = AsyncOpenAI(
-            api_key=api_key,
-            base_url=base_url,
-        )
-        # async with semaphore:
-        completion = await async_embedding_client.embeddings.create(
-            model=model,
-            input=[query]
-        )
-        return completion.data[0].embedding
+    @staticmethod
+    async def get_vectors(
+            queries: List[str],
+            model: str | None = None,
+    ) -> list[list[float]]:
+        """
+        批量向量嵌入API接口，一次请求嵌入多条文本，API密钥、地址与默认模型取自配置（API_KEY、BASE_URL、EMBEDDING_MODEL）
+        :param queries: 查询内容列表
+        :param model: 模型名称，默认使用配置中的 EMBEDDING_MODEL
+        :return: 与 queries 顺序一致的向量列表
+        """
+        if not queries:
+            return []
+        async with llm_limiter:
+            completion = await _embedding_client().embeddings.create(
+                model=model or settings.EMBEDDING_MODEL,
+                input=queries
+            )
+        return [item.embedding for item in sorted(completion.data, key=lambda item: item.index)]
 
 
 class ResponseGetterFactory:
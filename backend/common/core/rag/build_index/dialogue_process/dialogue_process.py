@@ -1,5 +1,7 @@
 import asyncio
+import hashlib
 import json
+import logging
 from jinja2 import Template
 
 from tqdm import tqdm
@@ -7,6 +9,9 @@ from tqdm import tqdm
 from backend.common.clean import clean_json_output
 from backend.common.core.llm.response_getter import GenericResponseGetter
 from .prompt import REPORT_GENERATION, LABEL_GENERATION
+from .report_merge import ReportMerger
+
+logger = logging.getLogger(__name__)
 
 
 class DialogueProcessor:
@@ -19,37 +24,93 @@ class DialogueProcessor:
         step = chunk_size - overlap
         return [dialogue[i:i + chunk_size] for i in range(0, len(dialogue), step)]
 
+    @staticmethod
+    def content_hash(data) -> str:
+        """对话或分块内容的 sha256 哈希，用于增量重建时比对内容变化"""
+        payload = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def _generate_report(self, chunk):
+        async with self.sem:
+            template = Template(REPORT_GENERATION)
+            agent_query = template.render(dialogue_data=json.dumps(chunk))
+            report = await self.llm.get_response(query=agent_query)
+            cleaned_report = clean_json_output(report)
+            try:
+                return json.loads(cleaned_report)
+            except json.JSONDecodeError:
+                return {}
+
+    async def _embed_report(self, report):
+        async with self.sem:
+            segment_topic_embedding = await self.llm.get_vector(query=report.get("segment_topic"))
+            report["segment_topic_embedding"] = segment_topic_embedding
+            return report
+
     async def report_generate(self, chunks: list):
-        async def process_chunk(chunk):
-            async with self.sem:
-                template = Template(REPORT_GENERATION)
-                agent_query = template.render(dialogue_data=json.dumps(chunk))
-                report = await self.llm.get_response(query=agent_query)
-                cleaned_report = clean_json_output(report)
-                try:
-                    return json.loads(cleaned_report)
-                except json.JSONDecodeError:
-                    return {}
-
-        tasks = [process_chunk(chunk) for chunk in chunks]
+        tasks = [self._generate_report(chunk) for chunk in chunks]
         report_list = []
         for coro in tqdm(asyncio.as_completed(tasks), total=len(tasks), desc="report_generate"):
             report_list.append(await coro)
         return report_list
 
     async def report_embedding(self, report_list: list):
-        async def process_report(report):
-            async with self.sem:
-                segment_topic_embedding = await self.llm.get_vector(query=report.get("segment_topic"))
-                report["segment_topic_embedding"] = segment_topic_embedding
-                return report
-
-        tasks = [process_report(report) for report in report_list]
+        tasks = [self._embed_report(report) for report in report_list]
         result_list = []
         for coro in tqdm(asyncio.as_completed(tasks), total=len(tasks), desc="report_embedding"):
             result_list.append(await coro)
         return result_list
 
+    async def report_pipeline(self, chunks: list, existing_reports: list = None, previous_topics: list = None):
+        """
+        流水线处理分块：每个分块的报告生成后立即合并去重并嵌入，最后一份报告到达时立即开始生成标签
+
+        :param chunks: 对话分块列表
+        :param existing_reports: 增量重建时保留的已有报告，参与合并但不重新嵌入
+        :param previous_topics: 增量重建前的段落主题列表，段落主题未变化时跳过标签生成
+        :return: 按开始时间排序的带嵌入报告列表, 标签(不含摘要嵌入，跳过时为 None), 合并统计
+        """
+        async def generate(index, chunk):
+            report = await self._generate_report(chunk)
+            report["chunk_hashes"] = [self.content_hash(chunk)]
+            return index, report
+
+        tasks = [generate(index, chunk) for index, chunk in enumerate(chunks)]
+        merger = ReportMerger()
+        merger.seed(existing_reports or [])
+        embedding_tasks = []
+        # 报告按完成顺序到达，但按分块序号合并：先到的报告暂存，序号连续的前缀一到齐就依次合并，
+        # 合并结果与完成顺序无关，同时仍尽早开始嵌入
+        pending = {}
+        next_index = 0
+        try:
+            for coro in tqdm(asyncio.as_completed(tasks), total=len(tasks), desc="report_pipeline"):
+                index, report = await coro
+                pending[index] = report
+                while next_index in pending:
+                    report = pending.pop(next_index)
+                    next_index += 1
+                    # 与已有段落重复的报告并入已有段落，不再嵌入
+                    if merger.add(report):
+                        embedding_tasks.append(asyncio.create_task(self._embed_report(report)))
+
+            # 标签生成只依赖段落主题，与尚未完成的报告嵌入并行执行
+            report_list = merger.sorted_reports()
+            topics = [report.get("segment_topic") for report in report_list]
+            if previous_topics is not None and topics == previous_topics:
+                label_task = asyncio.sleep(0, result=None)
+            else:
+                label_task = self.label_generate(report_list=report_list)
+            label, _ = await asyncio.gather(label_task, asyncio.gather(*embedding_tasks))
+        except BaseException:
+            for task in embedding_tasks:
+                task.cancel()
+            await asyncio.gather(*embedding_tasks, return_exceptions=True)
+            raise
+        logger.info(f"报告合并: 移除重复段落 {merger.stats['removed_segments']} 个, "
+                    f"节省嵌入调用 {merger.stats['saved_embedding_calls']} 次")
+        return report_list, label, merger.stats
+
     async def label_generate(self, report_list):
         segment_topic_list = [report["segment_topic"] for report in report_list]
         template = Template(LABEL_GENERATION)
@@ -68,11 +129,13 @@ class DialogueProcessor:
     async def process(self, dialogue: list):
         # 处理数据的逻辑
         dialogue_chunks = self.chunk_with_overlap(dialogue=dialogue)
-        report_list = await self.report_generate(chunks=dialogue_chunks)
-        report_with_embedding = await self.report_embedding(report_list=report_list)
-        label = await self.label_generate(report_list=report_list)
+        report_with_embedding, label, merge_stats = await self.report_pipeline(chunks=dialogue_chunks)
         label_with_embedding = await self.label_embedding(label=label)
-        return {"report_with_embedding": report_with_embedding, "label_with_embedding": label_with_embedding}
+        return {
+            "report_with_embedding": report_with_embedding,
+            "label_with_embedding": label_with_embedding,
+            "merge_stats": merge_stats,
+        }
 
 async def main():
     with open(r"D:\PycharmProjects\resource_recommendation\backend\data\data.txt", "r", encoding="utf-8") as f:
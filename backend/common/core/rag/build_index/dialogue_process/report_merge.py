@@ -0,0 +1,116 @@
+import math
+import re
+
+_SECONDS_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+
+
+def parse_seconds(value) -> float | None:
+    """
+    解析报告中的时间字段，例如 "125 秒" -> 125.0
+
+    :param value: 时间字段
+    :return: 秒数，无法解析时返回 None
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not isinstance(value, str):
+        return None
+    match = _SECONDS_PATTERN.search(value)
+    return float(match.group()) if match else None
+
+
+def format_seconds(seconds: float) -> str:
+    """按报告格式输出秒数，例如 125.0 -> "125 秒" """
+    return f"{seconds:g} 秒"
+
+
+def topic_similarity(topic_a: str, topic_b: str) -> float:
+    """
+    基于字符二元组的 Jaccard 相似度，适用于简短的中文段落主题
+
+    :param topic_a: 段落主题 a
+    :param topic_b: 段落主题 b
+    :return: 0 ~ 1 之间的相似度
+    """
+    def bigrams(text: str) -> set:
+        text = re.sub(r"\s+", "", text or "")
+        if len(text) < 2:
+            return {text} if text else set()
+        return {text[i:i + 2] for i in range(len(text) - 1)}
+
+    grams_a, grams_b = bigrams(topic_a), bigrams(topic_b)
+    if not grams_a or not grams_b:
+        return 0.0
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+
+class ReportMerger:
+    """
+    合并重叠分块产生的重复段落报告
+
+    分块之间存在重叠，相邻分块的报告时间范围会部分重合；当时间范围重叠且段落主题相近时，
+    后到达的报告被并入已有段落，不再单独嵌入和入库。
+    """
+
+    def __init__(self, topic_threshold: float = 0.5):
+        self.topic_threshold = topic_threshold
+        self.reports = []
+        self.removed_segments = 0
+
+    def seed(self, reports: list) -> None:
+        """加入已确认互不重复的段落（例如已入库的报告），不计入合并统计"""
+        self.reports.extend(reports)
+
+    def add(self, report: dict) -> bool:
+        """
+        加入一份报告
+
+        :param report: 段落报告
+        :return: 作为新段落保留时返回 True，被并入已有段落时返回 False
+        """
+        for kept in self.reports:
+            if self._is_duplicate(kept, report):
+                self._coalesce(kept, report)
+                self.removed_segments += 1
+                return False
+        self.reports.append(report)
+        return True
+
+    def sorted_reports(self) -> list:
+        """按开始时间排序后的段落报告"""
+        return sort_reports(self.reports)
+
+    @property
+    def stats(self) -> dict:
+        # 每个被合并的段落同时省去一次主题嵌入调用
+        return {"removed_segments": self.removed_segments, "saved_embedding_calls": self.removed_segments}
+
+    def _is_duplicate(self, kept: dict, report: dict) -> bool:
+        kept_start, kept_end = parse_seconds(kept.get("start_time")), parse_seconds(kept.get("end_time"))
+        start, end = parse_seconds(report.get("start_time")), parse_seconds(report.get("end_time"))
+        if None in (kept_start, kept_end, start, end):
+            return False
+        if start > kept_end or kept_start > end:
+            return False
+        return topic_similarity(kept.get("segment_topic"), report.get("segment_topic")) >= self.topic_threshold
+
+    @staticmethod
+    def _coalesce(kept: dict, report: dict) -> None:
+        # 保留已有段落的主题（其嵌入可能已在计算中），仅扩展时间范围并合并知识点
+        start = min(parse_seconds(kept["start_time"]), parse_seconds(report["start_time"]))
+        end = max(parse_seconds(kept["end_time"]), parse_seconds(report["end_time"]))
+        kept["start_time"] = format_seconds(start)
+        kept["end_time"] = format_seconds(end)
+        kept["duration"] = format_seconds(end - start)
+        kept["key_points"] = list(dict.fromkeys((kept.get("key_points") or []) + (report.get("key_points") or [])))
+        # 记录段落覆盖的分块，供增量重建判断段落是否仍然有效
+        kept["chunk_hashes"] = list(dict.fromkeys((kept.get("chunk_hashes") or []) + (report.get("chunk_hashes") or [])))
+
+
+def sort_reports(reports: list) -> list:
+    """按开始时间排序段落报告，无法解析开始时间的排在最后"""
+    def sort_key(report: dict) -> float:
+        seconds = parse_seconds(report.get("start_time"))
+        return math.inf if seconds is None else seconds
+
+    return sorted(reports, key=sort_key)
@@ -2,12 +2,12 @@ import asyncio
 
 from backend.common.core.llm.base import ResponseGetter
 from .base_instruction import BaseInstruction
-from ..query_template.extraction_templates import EntityExtractionTemplate, RelationExtractionTemplate, AttributeExtractionTemplate, TriplesTracingTemplate, RelationTypeMatchTemplate  # 添加溯源智能体模板
-from ..response_parser.extraction_parser import EntityExtractionResponseParser, RelationExtractionResponseParser, AttributeExtractionResponseParser
+from ..query_template.extraction_templates import EntityExtractionTemplate, RelationExtractionTemplate, AttributeExtractionTemplate, TriplesTracingTemplate, RelationTypeMatchTemplate, FusedExtractionTemplate  # 添加溯源智能体模板
+from ..response_parser.extraction_parser import EntityExtractionResponseParser, RelationExtractionResponseParser, AttributeExtractionResponseParser, FusedExtractionResponseParser
 
 from typing import List, Dict, Tuple
 from hashlib import sha256
-import random
+import unicodedata
 
 import logging
 
@@ -20,7 +20,8 @@ class ExtractionInstruction1(BaseInstruction):
             ResponseGetter,
             chunk: str,
             kg_schema: List,
-            schema_definition: Dict
+            schema_definition: Dict,
+            schema_fragments: Dict = None,
         ):
         """
         参数三件套，为整条责任链的起始参数
@@ -28,11 +29,12 @@ class ExtractionInstruction1(BaseInstruction):
         :param chunk: 待提取的文本
         :param kg_schema: 知识图谱的schema
         :param schema_definition: 知识图谱的schema定义
+        :param schema_fragments: 预先构建的 schema 提示词片段，各步骤渲染时直接复用
         :return: 下一步责任链的执行结果
         """
         # 执行实体提取与结果解析
         query = EntityExtractionTemplate.render_template(
-            kg_schema=kg_schema, schema_definition=schema_definition, text_chunk=chunk)  # 生成步骤请求
+            kg_schema=kg_schema, schema_definition=schema_definition, text_chunk=chunk, fragments=schema_fragments)  # 生成步骤请求
         response = await ai_response_getter.get_response(
             query=query
         )  # 获取响应
@@ -48,7 +50,8 @@ class ExtractionInstruction1(BaseInstruction):
                 ins1_output=ins1_output,
                 chunk=chunk,
                 kg_schema=kg_schema,
-                schema_definition=schema_definition
+                schema_definition=schema_definition,
+                schema_fragments=schema_fragments,
             )
 
 
@@ -60,9 +63,11 @@ class ExtractionInstruction2(BaseInstruction):
             chunk: str,
             kg_schema: List,
             schema_definition: Dict,
+            schema_fragments: Dict = None,
     ):
         query = RelationExtractionTemplate.render_template(
-            entity_type_dict=ins1_output[0], kg_schema=kg_schema, schema_definition=schema_definition, text_chunk=chunk)
+            entity_type_dict=ins1_output[0], kg_schema=kg_schema, schema_definition=schema_definition, text_chunk=chunk,
+            fragments=schema_fragments)
         
         # 所得三元组集合字符串
         response = await ai_response_getter.get_response(
@@ -83,6 +88,7 @@ class ExtractionInstruction2(BaseInstruction):
                 chunk=chunk,
                 kg_schema=kg_schema,
                 schema_definition=schema_definition,
+                schema_fragments=schema_fragments,
             )
 
 
@@ -95,6 +101,7 @@ class ExtractionInstruction3(BaseInstruction):
             chunk: str,
             kg_schema: List,
             schema_definition: Dict,
+            schema_fragments: Dict = None,
     ):
         # 执行三元组溯源与结果解析
         query = TriplesTracingTemplate.render_template(
@@ -104,7 +111,8 @@ class ExtractionInstruction3(BaseInstruction):
         query_ = RelationTypeMatchTemplate.render_template(
             triples=ins2_output,
             kg_schema=kg_schema,
-            schema_definition=schema_definition
+            schema_definition=schema_definition,
+            fragments=schema_fragments,
         )
 
         # 使用asyncio.gather并行执行两个请求
@@ -159,6 +167,7 @@ class ExtractionInstruction3(BaseInstruction):
                 ins2_output=ins3_output,
                 chunk=chunk,
                 kg_schema=kg_schema,
+                schema_fragments=schema_fragments,
             )
         else:
             return ins2_output, ins3_output
@@ -172,10 +181,11 @@ class ExtractionInstruction4(BaseInstruction):
             ins2_output: Tuple,
             chunk: str,
             kg_schema: List,
+            schema_fragments: Dict = None,
     ):
         # 执行属性提取与结果解析
         query = AttributeExtractionTemplate.render_template(
-            text_chunk=chunk, kg_schema=kg_schema, extracted_entities_dict=ins1_output[0])
+            text_chunk=chunk, kg_schema=kg_schema, extracted_entities_dict=ins1_output[0], fragments=schema_fragments)
         response = await ai_response_getter.get_response(
             query=query,
         )
@@ -188,14 +198,19 @@ class ExtractionInstruction4(BaseInstruction):
             return ins1_output, ins2_output, ins3_output
 
 
-def random_slice(lst, slice_length):
+def normalize_triple_part(text: str) -> str:
+    """
+    归一化三元组的组成部分：全半角统一、去除首尾空白、合并连续空白、忽略大小写
+    """
+    return " ".join(unicodedata.normalize("NFKC", str(text)).split()).casefold()
+
+
+def triple_id(directional_entity: str, relation: str, directed_entity: str) -> str:
     """
-    对三元组的哈希值进行随机切片处理，控制其长度
+    由归一化后的 (头实体, 关系, 尾实体) 计算稳定的三元组 ID，同一三元组在任何分块、任何一次运行中 ID 都相同
     """
-    if slice_length > len(lst):
-        return "Error: slice length is greater than list length."
-    start = random.randint(0, len(lst) - slice_length)
-    return lst[start:start + slice_length]
+    key = "\x1f".join(normalize_triple_part(part) for part in (directional_entity, relation, directed_entity))
+    return sha256(key.encode('utf-8')).hexdigest()[:16]
 
 
 async def run_extraction_chain(
@@ -203,6 +218,7 @@ async def run_extraction_chain(
         chunk: str = "",
         kg_schema: List = None,
         schema_definition: Dict = None,
+        schema_fragments: Dict = None,
 ):
     """
     参数待定，是为chain的起始参数
@@ -226,7 +242,8 @@ async def run_extraction_chain(
         ai_response_getter=ai_response_getter,
         chunk=chunk,
         kg_schema=kg_schema,
-        schema_definition=schema_definition
+        schema_definition=schema_definition,
+        schema_fragments=schema_fragments,
     )
     if not result:  # 如果无法确定任何关系，直接返回空值
         return [], {}  # 分别是kg_json_format和source_row_list
@@ -237,6 +254,53 @@ async def run_extraction_chain(
     entity_attribute_dict = ins3_output[0]
     source_text_dict = ins2_output[0][2]
 
+    return assemble_kg(
+        kg_schema=kg_schema,
+        instance_type_triple_pair_dict=instance_type_triple_pair_dict,
+        relation_type_dict=relation_type_dict,
+        entity_attribute_dict=entity_attribute_dict,
+        source_text_dict=source_text_dict,
+    )
+
+
+async def run_fused_extraction_chain(
+        ai_response_getter: ResponseGetter = None,
+        chunk: str = "",
+        kg_schema: List = None,
+        schema_definition: Dict = None,
+        schema_fragments: Dict = None,
+):
+    """
+    融合提取：一次结构化 JSON 调用同时得到实体、类型三元组、溯源文本和属性，输出与 run_extraction_chain 一致
+    """
+    query = FusedExtractionTemplate.render_template(
+        kg_schema=kg_schema, schema_definition=schema_definition, text_chunk=chunk, fragments=schema_fragments)
+    response = await ai_response_getter.get_response(query=query)
+
+    _, instance_type_triple_pair_dict, relation_type_dict, entity_attribute_dict, source_text_dict = \
+        FusedExtractionResponseParser.parse(response)
+    if not instance_type_triple_pair_dict:  # 如果无法确定任何关系，直接返回空值
+        return [], {}
+
+    return assemble_kg(
+        kg_schema=kg_schema,
+        instance_type_triple_pair_dict=instance_type_triple_pair_dict,
+        relation_type_dict=relation_type_dict,
+        entity_attribute_dict=entity_attribute_dict,
+        source_text_dict=source_text_dict,
+    )
+
+
+def assemble_kg(
+        kg_schema: List,
+        instance_type_triple_pair_dict: Dict,
+        relation_type_dict: Dict,
+        entity_attribute_dict: Dict,
+        source_text_dict: Dict,
+):
+    """
+    将提取的中间结果整合为 kg_json_format 和 source_row_list
+    """
     # 得到类型对应的属性，防止有些实体没有属性
     schema_type_attributes = {}
     for schema in kg_schema:
@@ -251,10 +315,7 @@ async def run_extraction_chain(
     for triples, type_triples in instance_type_triple_pair_dict.items():
         try:
             directional_entity, relation, directed_entity = triples
-            triple_hash = random_slice(
-                sha256(f"({directional_entity}, {relation}, {directed_entity})".encode('utf-8')).hexdigest(),
-                8
-            )
+            triple_hash = triple_id(directional_entity, relation, directed_entity)
             # 添加source数据行
             source_row_list.append({"ID": triple_hash, "TripleSource": source_text_dict[f"{directional_entity}-{relation}-{directed_entity}"]})
             directional_entity_type, relation_type, directed_entity_type = type_triples
@@ -283,3 +344,16 @@ async def run_extraction_chain(
         except Exception:
             continue
     return kg_json_format, source_row_list
+
+
+# 可按图谱选择的提取模式：chain 为分步责任链，fused 为单次融合提取
+EXTRACTION_CHAINS = {
+    "chain": run_extraction_chain,
+    "fused": run_fused_extraction_chain,
+}
+
+# 各提取模式的版本号，修改提示词、解析或组装逻辑后需递增，使分块提取缓存失效
+EXTRACTION_CHAIN_VERSIONS = {
+    "chain": "1",
+    "fused": "1",
+}
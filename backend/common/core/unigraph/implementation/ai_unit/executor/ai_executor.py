@@ -1,5 +1,5 @@
 from backend.common.core.llm.response_getter import ResponseGetterFactory
-from ..chains.extraction_chain import run_extraction_chain
+from ..chains.extraction_chain import run_extraction_chain, EXTRACTION_CHAINS
 
 
 class AIExecutor:
@@ -13,6 +13,7 @@ class AIExecutor:
         # 以三个模块执行器的对象类型为判断依据，决定执行哪个chain
         # llm_parameter所决定的各类response_getter，由对应的chain执行工厂方法。
         if isinstance(module_executor, SemanticKGConstructor):
-            return await run_extraction_chain(ai_response_getter=ai_response_getter, **kwargs)  # 这里还需要传入ai_response_getter
+            chain = EXTRACTION_CHAINS.get(module_executor.extraction_mode, run_extraction_chain)
+            return await chain(ai_response_getter=ai_response_getter, **kwargs)  # 这里还需要传入ai_response_getter
         else:
             pass
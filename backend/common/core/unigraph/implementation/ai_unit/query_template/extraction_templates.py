@@ -1,14 +1,14 @@
 import json
+from hashlib import sha256
 
 from jinja2 import Template
-from typing import List, Dict
+from typing import List, Dict, Any
 from .base_template import InstructionTemplate
 
 
 class EntityExtractionTemplate(InstructionTemplate):
-    @staticmethod
-    def get_template():
-        template = """
+    # 模板在导入时编译一次，渲染时直接复用
+    _template = Template("""
 [DEFINE AGENT: Entity Extractor]
     [DEFINE PERSONA:]
         You are an expert in extracting entities that meet the type definition from the text provided by the user based on the entity type.
@@ -30,12 +30,16 @@ class EntityExtractionTemplate(InstructionTemplate):
         [COMMAND-3 <apply-constraints> output format </apply-constraints> Use the specified format constraint to output your answer.]
     [END INSTRUCTION]
 [END AGENT]
-        """
-        return Template(template)
+        """)
+
+    @staticmethod
+    def get_template():
+        return EntityExtractionTemplate._template
 
     @staticmethod
-    def render_template(kg_schema: List, schema_definition: Dict, text_chunk: str):
-        entity_types_definitions = EntityExtractionTemplate.parameter_conversion(kg_schema, schema_definition)
+    def render_template(kg_schema: List, schema_definition: Dict, text_chunk: str, fragments: Dict = None):
+        fragments = fragments or schema_fragments(kg_schema, schema_definition)
+        entity_types_definitions = fragments["entity_types_definitions"]
         return EntityExtractionTemplate.get_template().render(text_chunk=text_chunk, entity_types_definitions=entity_types_definitions)
 
     @staticmethod
@@ -58,9 +62,7 @@ class EntityExtractionTemplate(InstructionTemplate):
 
 
 class RelationExtractionTemplate(InstructionTemplate):
-    @staticmethod
-    def get_template():
-        template = """
+    _template = Template("""
 [DEFINE AGENT: Triples Extractor]
     [DEFINE PERSONA:]
         You are an expert in using the given relationships and entities to construct triples.
@@ -83,12 +85,17 @@ class RelationExtractionTemplate(InstructionTemplate):
         [COMMAND-3 <apply-constraints> output format </apply-constraints> Use the specified format constraint to output your answer.]
     [END INSTRUCTION]
 [END AGENT]
-"""
-        return Template(template)
+""")
 
     @staticmethod
-    def render_template(entity_type_dict: Dict, text_chunk: str, kg_schema: List, schema_definition: Dict):
-        entities_set, relation_types_definitions = RelationExtractionTemplate.parameter_conversion(entity_type_dict, kg_schema, schema_definition)
+    def get_template():
+        return RelationExtractionTemplate._template
+
+    @staticmethod
+    def render_template(entity_type_dict: Dict, text_chunk: str, kg_schema: List, schema_definition: Dict, fragments: Dict = None):
+        entities_set = ', '.join(entity_type_dict)
+        fragments = fragments or schema_fragments(kg_schema, schema_definition)
+        relation_types_definitions = fragments["relation_types_definitions"]
         # 默认关系类型作为关系
         return RelationExtractionTemplate.get_template().render(entities=entities_set, text_chunk=text_chunk, relation_definitions=relation_types_definitions)
 
@@ -117,9 +124,7 @@ class RelationExtractionTemplate(InstructionTemplate):
 
 
 class TriplesTracingTemplate(InstructionTemplate):
-    @staticmethod
-    def get_template():
-        template = """
+    _template = Template("""
 [DEFINE AGENT: Triples Tracer]
     [DEFINE PERSONA:]
         You are an expert in tracing triples.
@@ -141,8 +146,11 @@ class TriplesTracingTemplate(InstructionTemplate):
         [COMMAND-3 <apply-constraints> output format </apply-constraints> Use the specified format constraint to output your answer.]
     [END INSTRUCTION]
 [END AGENT]
-        """
-        return Template(template)
+        """)
+
+    @staticmethod
+    def get_template():
+        return TriplesTracingTemplate._template
 
     @staticmethod
     def render_template(triples_set: str, text_chunk: str):
@@ -150,9 +158,7 @@ class TriplesTracingTemplate(InstructionTemplate):
 
 
 class RelationTypeMatchTemplate(InstructionTemplate):
-    @staticmethod
-    def get_template():
-        template = """
+    _template = Template("""
 [DEFINE AGENT: Relationship type match]
     [DEFINE PERSONA:]
         You are an expert in matching the relationship types of the triples.
@@ -173,12 +179,16 @@ class RelationTypeMatchTemplate(InstructionTemplate):
         [COMMAND-2 <apply-constraints> output format </apply-constraints> Use the specified format constraint to output your answer.]
     [END INSTRUCTION]
 [END AGENT]
-        """
-        return Template(template)
+        """)
 
     @staticmethod
-    def render_template(triples: str, kg_schema: List, schema_definition: Dict):
-        relation_types = RelationTypeMatchTemplate.parameter_conversion(kg_schema, schema_definition)
+    def get_template():
+        return RelationTypeMatchTemplate._template
+
+    @staticmethod
+    def render_template(triples: str, kg_schema: List, schema_definition: Dict, fragments: Dict = None):
+        fragments = fragments or schema_fragments(kg_schema, schema_definition)
+        relation_types = fragments["relation_types"]
         return RelationTypeMatchTemplate.get_template().render(triples=triples, relation_types=relation_types)
 
     @staticmethod
@@ -201,9 +211,7 @@ class RelationTypeMatchTemplate(InstructionTemplate):
 
 
 class AttributeExtractionTemplate(InstructionTemplate):
-    @staticmethod
-    def get_template():
-        template = """
+    _template = Template("""
 [DEFINE AGENT: Attribute Extractor]
     [DEFINE PERSONA:]
         You are a professional attribute extraction expert, based on the given entities and attributes.
@@ -224,12 +232,17 @@ class AttributeExtractionTemplate(InstructionTemplate):
         [COMMAND-2 <apply-constraints> output format </apply-constraints> Use the specified format constraint to output your answer.]
     [END INSTRUCTION]
 [END AGENT]
-        """
-        return Template(template)
+        """)
+
+    @staticmethod
+    def get_template():
+        return AttributeExtractionTemplate._template
 
     @staticmethod
-    def render_template(text_chunk: str, kg_schema: List, extracted_entities_dict: Dict):
-        entities_with_attribute_keys = AttributeExtractionTemplate.parameter_conversion(kg_schema, extracted_entities_dict)
+    def render_template(text_chunk: str, kg_schema: List, extracted_entities_dict: Dict, fragments: Dict = None):
+        fragments = fragments or schema_fragments(kg_schema)
+        type_attributes_dict = fragments["type_attributes_dict"]
+        entities_with_attribute_keys = AttributeExtractionTemplate.format_entities(type_attributes_dict, extracted_entities_dict)
         return AttributeExtractionTemplate.get_template().render(text_chunk=text_chunk, entities_with_attribute_keys=entities_with_attribute_keys)
 
     @staticmethod
@@ -237,12 +250,27 @@ class AttributeExtractionTemplate(InstructionTemplate):
         """
         解析schema并得到类型(类型定义), ...
         """
-        entities_with_type = list()
+        return AttributeExtractionTemplate.format_entities(
+            AttributeExtractionTemplate.type_attributes(kg_schema), extracted_entities_dict)
+
+    @staticmethod
+    def type_attributes(kg_schema: List) -> Dict:
+        """
+        解析schema并得到 {类型: [属性1, 属性2, ...], ...}
+        """
         type_attributes_dict = dict()
         for schema in kg_schema:
             for k, v in schema.items():
                 if k in ["DirectionalEntityType", "DirectedEntityType"]:
                     type_attributes_dict[v['Name']] = json.loads(v['Attributes'])
+        return type_attributes_dict
+
+    @staticmethod
+    def format_entities(type_attributes_dict: Dict, extracted_entities_dict: Dict):
+        """
+        按实体类型的属性得到 实体(属性1, 属性2), ...
+        """
+        entities_with_type = list()
         for entity, entity_type in extracted_entities_dict.items():
             try:
                 attribute_keys = type_attributes_dict[entity_type]
@@ -251,3 +279,108 @@ class AttributeExtractionTemplate(InstructionTemplate):
             except KeyError:
                 continue
         return ', '.join(entities_with_type)
+
+
+class FusedExtractionTemplate(InstructionTemplate):
+    _template = Template("""
+[DEFINE AGENT: Knowledge Graph Extractor]
+    [DEFINE PERSONA:]
+        You are an expert in extracting typed entities, typed triples, their source sentences and entity attributes from the text provided by the user in a single pass.
+    [END PERSONA]
+
+    [DEFINE INPUT]
+        documentation: ${ {{text_chunk}} }$
+        entity types with definition: ${ {{entity_types_definitions}} }$
+        entity types with attributes: ${ {{type_attributes}} }$
+        relationship types with definition: ${ {{relation_types}} }$
+        type triples: ${ {{type_triples}} }$
+    [END INPUT]
+
+    [DEFINE CONSTRAINTS]
+        action integrity: Ensure the integrity of the extracted entities within their original text, and only extract entities that meet <REF> entity types with definition </REF>.
+        entity restriction: The head and tail of every triple must be entities listed in "entities" of your output.
+        type constraint: The relation_type of every triple must be the semantically closest type in <REF> relationship types with definition </REF>, and the types of head, relation and tail should follow <REF> type triples </REF>.
+        semantic association: The source of each triple must be sentences copied from the <REF> documentation </REF> that express the meaning of the triple.
+        attribute integrity: Assign every attribute of the entity type listed in <REF> entity types with attributes </REF>, and assign None to attributes that do not exist in the documentation.
+        output format: Output a single JSON object without any other text: {"entities": [{"name": "entity", "type": "entity type", "attributes": {"attribute": "value"}}], "triples": [{"head": "entity1", "relation": "relationship", "relation_type": "relationship type", "tail": "entity2", "source": "source information"}]}
+    [END CONSTRAINTS]
+
+    [DEFINE INSTRUCTION]
+        [COMMAND-1 <apply-constraints> action integrity, attribute integrity </apply-constraints> Extract all entities in the given <REF> documentation </REF> with their types and attributes.]
+        [COMMAND-2 <apply-constraints> entity restriction, type constraint </apply-constraints> Thoroughly explore the relationships between the extracted entities to construct typed triples, and avoid any omissions.]
+        [COMMAND-3 <apply-constraints> semantic association </apply-constraints> Trace the source information of each triple.]
+        [COMMAND-4 <apply-constraints> output format </apply-constraints> Use the specified format constraint to output your answer.]
+    [END INSTRUCTION]
+[END AGENT]
+        """)
+
+    @staticmethod
+    def get_template():
+        return FusedExtractionTemplate._template
+
+    @staticmethod
+    def render_template(kg_schema: List, schema_definition: Dict, text_chunk: str, fragments: Dict = None):
+        fragments = fragments or schema_fragments(kg_schema, schema_definition)
+        return FusedExtractionTemplate.get_template().render(
+            text_chunk=text_chunk,
+            entity_types_definitions=fragments["entity_types_definitions"],
+            type_attributes=fragments["fused_type_attributes"],
+            relation_types=fragments["relation_types"],
+            type_triples=fragments["fused_type_triples"],
+        )
+
+    @staticmethod
+    def parameter_conversion(kg_schema: List):
+        """
+        解析schema并得到 类型(属性1, 属性2), ... 以及 (类型1, 关系类型, 类型2), ...
+        """
+        type_attributes_dict = dict()
+        type_triples = list()
+        for schema in kg_schema:
+            try:
+                directional, directed = schema["DirectionalEntityType"], schema["DirectedEntityType"]
+                for entity_type in (directional, directed):
+                    type_attributes_dict[entity_type['Name']] = json.loads(entity_type['Attributes'])
+                type_triples.append(f"({directional['Name']}, {schema['RelationType']}, {directed['Name']})")
+            except (KeyError, TypeError, ValueError):
+                # schema本身存在问题，直接跳过该类型
+                continue
+        type_attributes = ', '.join(
+            f"{entity_type}({', '.join(attribute_keys)})" for entity_type, attribute_keys in type_attributes_dict.items()
+            if attribute_keys
+        )
+        # 对type_triples进行去重
+        return type_attributes, ', '.join(dict.fromkeys(type_triples))
+
+
+def schema_hash(kg_schema: List, schema_definition: Dict = None) -> str:
+    """
+    计算 schema 及其定义的内容哈希
+    """
+    payload = json.dumps([kg_schema, schema_definition], ensure_ascii=False, sort_keys=True, default=str)
+    return sha256(payload.encode('utf-8')).hexdigest()
+
+
+def schema_fragments(kg_schema: List, schema_definition: Dict = None) -> Dict[str, Any]:
+    """
+    构建由 schema 派生的提示词片段及 schema 哈希
+
+    构建开销与 schema 大小成正比，应在每次提取开始时构建一次（见 SemanticKGConstructor），
+    再通过 fragments 参数传给各模板的 render_template，分块渲染时不再重复序列化和哈希 schema
+    """
+    hash_value = schema_hash(kg_schema, schema_definition)
+    schema_definition = schema_definition or {}
+    fused_type_attributes, fused_type_triples = FusedExtractionTemplate.parameter_conversion(kg_schema)
+    try:
+        type_attributes_dict = AttributeExtractionTemplate.type_attributes(kg_schema)
+    except (KeyError, TypeError, ValueError):
+        type_attributes_dict = {}
+    return {
+        "hash": hash_value,
+        "entity_types_definitions": EntityExtractionTemplate.parameter_conversion(kg_schema, schema_definition),
+        "relation_types_definitions": RelationExtractionTemplate.parameter_conversion({}, kg_schema, schema_definition)[1],
+        "relation_types": RelationTypeMatchTemplate.parameter_conversion(kg_schema, schema_definition),
+        "type_attributes_dict": type_attributes_dict,
+        "fused_type_attributes": fused_type_attributes,
+        "fused_type_triples": fused_type_triples,
+    }
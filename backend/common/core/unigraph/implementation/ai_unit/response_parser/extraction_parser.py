@@ -1,3 +1,6 @@
+import json
+
+from backend.common.clean import clean_json_output
 from .base_parser import ResponseParser
 
 
@@ -149,3 +152,53 @@ class AttributeExtractionResponseParser(ResponseParser):
                 pass
 
         return entity_dict
+
+
+class FusedExtractionResponseParser(ResponseParser):
+    @staticmethod
+    def parse(response: str, **kwargs):
+        """
+        解析融合提取的 JSON 字符串
+        :param response: {"entities": [{"name", "type", "attributes"}], "triples": [{"head", "relation", "relation_type", "tail", "source"}]}
+        :return: 与分步提取一致的中间结果
+                 实体类型字典 -> {实体1: 实体类型1, ...}
+                 三元组字典 -> {(实体1, 关系, 实体2): (实体类型1, 关系, 实体类型2), ...}
+                 关系类型字典 -> {关系: 关系类型, ...}
+                 实体属性字典 -> {实体1: {属性1: 值1, ...}, ...}
+                 源文本字典 -> {实体1-关系-实体2: 源文本, ...}
+        """
+        try:
+            data = json.loads(clean_json_output(response))
+        except (json.JSONDecodeError, TypeError):
+            return {}, {}, {}, {}, {}
+        if not isinstance(data, dict):
+            return {}, {}, {}, {}, {}
+
+        entity_type_dict = {}
+        entity_attribute_dict = {}
+        for entity in data.get("entities") or []:
+            try:
+                name = str(entity["name"]).strip()
+                entity_type_dict[name] = str(entity["type"]).strip()
+                attributes = entity.get("attributes") or {}
+                entity_attribute_dict[name] = {str(k).strip(): str(v).strip() for k, v in attributes.items()}
+            except (KeyError, TypeError, AttributeError):
+                continue
+
+        triples_dict = {}
+        relation_type_dict = {}
+        source_text_dict = {}
+        for triple in data.get("triples") or []:
+            try:
+                entity1, relation, entity2 = (str(triple[k]).strip() for k in ("head", "relation", "tail"))
+            except (KeyError, TypeError):
+                continue
+            # 三元组的实体必须来自已提取的实体
+            if entity1 not in entity_type_dict or entity2 not in entity_type_dict:
+                continue
+            triples_dict[(entity1, relation, entity2)] = (entity_type_dict[entity1], relation, entity_type_dict[entity2])
+            if triple.get("relation_type"):
+                relation_type_dict[relation] = str(triple["relation_type"]).strip()
+            source_text_dict[f"{entity1}-{relation}-{entity2}"] = str(triple.get("source") or "").strip()
+
+        return entity_type_dict, triples_dict, relation_type_dict, entity_attribute_dict, source_text_dict
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import logging
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import numpy as np
+from openai import APIConnectionError, InternalServerError, RateLimitError
+
+from backend.common.core.llm.response_getter import GenericResponseGetter
+from ..ai_unit.chains.extraction_chain import triple_id
+
+logger = logging.getLogger(__name__)
+
+_EMPTY_VALUES = (None, "", "None", "Unknown")
+# 嵌入接口的暂时性错误（连接失败、超时、限流、服务端错误）只跳过本次消解；配置与鉴权错误照常抛出
+_TRANSIENT_EMBEDDING_ERRORS = (APIConnectionError, RateLimitError, InternalServerError)
+_NAME_SEPARATORS = re.compile(r"[\s\W_]+")
+
+
+def normalize_entity_name(name: str) -> str:
+    """名称比较前的归一化：全半角统一、忽略大小写、去除空白与标点"""
+    return _NAME_SEPARATORS.sub("", unicodedata.normalize("NFKC", str(name)).casefold())
+
+
+def edit_similarity(a: str, b: str) -> float:
+    """基于编辑距离的名称相似度，1 - 编辑距离 / 较长名称长度"""
+    if not a or not b:
+        return 0.0
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return 1 - previous[-1] / max(len(a), len(b))
+
+
+class EntityResolver:
+    """
+    跨分块实体消解：按实体类型分块，批量嵌入 "名称 + 属性" 文本，
+    在每个类型内用一次矩阵乘法得到相似度矩阵
+
+    只有同时满足以下条件的实体才会合并：类型相同、向量相似度不低于阈值、名称在字面上兼容
+    （归一化后相同、一方是另一方的前缀，或编辑相似度不低于 name_threshold）。
+    "一次函数/二次函数"、"正比例/反比例" 这类向量相近但含义不同的名称因字面不兼容而不会合并。
+    聚类采用全连接：实体只有与组内每个成员都满足条件才能加入该组，不会出现 A~B~C 的链式合并
+    """
+
+    def __init__(self, threshold: float = 0.92, name_threshold: float = 0.9, batch_size: int = 64):
+        self.threshold = threshold
+        self.name_threshold = name_threshold
+        self.batch_size = batch_size
+
+    async def resolve(self, kg: List[Dict], triple_sources: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """
+        合并近似重复的实体，并改写三元组端点
+
+        :param kg: 合并后的三元组列表
+        :param triple_sources: 三元组溯源列表
+        :return: 消解后的三元组列表与溯源列表
+        """
+        entities, occurrences = self._collect_entities(kg)
+        canonical = await self.canonical_names(entities, occurrences)
+        if not canonical:
+            return kg, triple_sources
+        return self._rewrite(kg, triple_sources, canonical)
+
+    async def canonical_names(self, entities: Dict[Tuple[str, str], Dict],
+                              occurrences: Dict[Tuple[str, str], int]) -> Dict[Tuple[str, str], str]:
+        """
+        计算近似重复实体的规范名称
+
+        :param entities: (实体类型, 实体名称) 到实体属性的映射
+        :param occurrences: (实体类型, 实体名称) 到出现次数的映射，出现次数最多的名称作为规范名称
+        :return: 需要合并的 (实体类型, 实体名称) 到规范名称的映射
+        """
+        blocks = {}
+        for entity_type, name in entities:
+            blocks.setdefault(entity_type, []).append(name)
+        blocks = {entity_type: names for entity_type, names in blocks.items() if len(names) > 1}
+        if not blocks:
+            return {}
+
+        keys = [(entity_type, name) for entity_type, names in blocks.items() for name in names]
+        try:
+            vectors = await self._embed([self._entity_text(key[1], entities[key]) for key in keys])
+        except _TRANSIENT_EMBEDDING_ERRORS as e:
+            logger.warning(f"实体消解嵌入暂时失败，跳过消解: {e}")
+            return {}
+        vector_map = dict(zip(keys, vectors))
+
+        canonical = {}
+        for entity_type, names in blocks.items():
+            matrix = np.asarray([vector_map[(entity_type, name)] for name in names], dtype=np.float32)
+            order = sorted(range(len(names)), key=lambda i: (-occurrences.get((entity_type, names[i]), 0), len(names[i]), names[i]))
+            for group in self._similar_groups(matrix, names, order):
+                if len(group) < 2:
+                    continue
+                group_names = [names[i] for i in group]
+                # 出现次数最多的名称作为规范名称，次数相同时取更短、字典序更小的名称
+                target = min(group_names, key=lambda n: (-occurrences.get((entity_type, n), 0), len(n), n))
+                for name in group_names:
+                    if name != target:
+                        canonical[(entity_type, name)] = target
+
+        if canonical:
+            logger.info(f"实体消解: 合并实体 {len(canonical)} 个")
+        return canonical
+
+    async def _embed(self, texts: List[str]) -> List[List[float]]:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(GenericResponseGetter.get_vectors(queries=batch) for batch in batches))
+        return [vector for batch in results for vector in batch]
+
+    def names_compatible(self, name_a: str, name_b: str) -> bool:
+        """名称字面兼容：归一化后相同、较短名称是较长名称的前缀，或编辑相似度不低于 name_threshold"""
+        a, b = normalize_entity_name(name_a), normalize_entity_name(name_b)
+        if not a or not b:
+            return False
+        shorter, longer = sorted((a, b), key=len)
+        return longer.startswith(shorter) or edit_similarity(a, b) >= self.name_threshold
+
+    def _similar_groups(self, matrix: np.ndarray, names: List[str], order: List[int]) -> List[List[int]]:
+        """
+        在归一化向量上计算相似度矩阵，按全连接聚类得到相似实体组
+
+        :param matrix: 实体向量矩阵
+        :param names: 与矩阵各行对应的实体名称
+        :param order: 实体加入聚类的顺序，出现次数多的实体优先成为组的首个成员
+        :return: 实体序号分组
+        """
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+        similar = (matrix @ matrix.T) >= self.threshold
+
+        groups = []
+        for i in order:
+            for group in groups:
+                # 全连接：必须与组内每个成员都相似且名称兼容
+                if all(similar[i, j] and self.names_compatible(names[i], names[j]) for j in group):
+                    group.append(i)
+                    break
+            else:
+                groups.append([i])
+        return groups
+
+    @staticmethod
+    def _collect_entities(kg: List[Dict]) -> Tuple[Dict[Tuple[str, str], Dict], Counter]:
+        entities = {}
+        occurrences = Counter()
+        for triple in kg:
+            for side in ("DirectionalEntity", "DirectedEntity"):
+                entity = triple[side]
+                key = (entity.get("Type"), entity.get("Name"))
+                entities.setdefault(key, entity.get("Attributes"))
+                occurrences[key] += 1
+        return entities, occurrences
+
+    @staticmethod
+    def _entity_text(name: str, attributes) -> str:
+        if isinstance(attributes, dict):
+            attributes = {k: v for k, v in attributes.items() if v not in _EMPTY_VALUES}
+            if attributes:
+                return f"{name} {json.dumps(attributes, ensure_ascii=False, sort_keys=True)}"
+        return name
+
+    @staticmethod
+    def _rewrite(kg: List[Dict], triple_sources: List[Dict], canonical: Dict) -> Tuple[List[Dict], List[Dict]]:
+        """改写三元组端点为规范实体，重新计算三元组 ID 并合并由此产生的重复三元组"""
+        # 避免循环导入
+        from .kg_constructor import merge_chunk_triples
+
+        id_map = {}
+        rewritten = []
+        for triple in kg:
+            triple = dict(triple)
+            merged = False
+            for side in ("DirectionalEntity", "DirectedEntity"):
+                entity = triple[side]
+                target = canonical.get((entity.get("Type"), entity.get("Name")))
+                if target:
+                    triple[side] = {**entity, "Name": target}
+                    merged = True
+            head, tail = triple["DirectionalEntity"]["Name"], triple["DirectedEntity"]["Name"]
+            # 实体合并后首尾变为同一实体的三元组没有意义，直接丢弃
+            if merged and head == tail and triple["DirectionalEntity"].get("Type") == triple["DirectedEntity"].get("Type"):
+                continue
+            new_id = triple_id(head, triple["Relation"].get("Name"), tail)
+            id_map.setdefault(triple["ID"], new_id)
+            triple["ID"] = new_id
+            rewritten.append(triple)
+
+        rewritten_sources = [
+            {"ID": id_map[row["ID"]], "TripleSource": source}
+            for row in triple_sources if row["ID"] in id_map
+            for source in (row["TripleSource"] or "").split("\n")
+        ]
+        return merge_chunk_triples([(rewritten, rewritten_sources)])
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+from typing import Any, Dict, List, Tuple
+
+from backend.common.core.rag.build_index.dialogue_process.dialogue_process import DialogueProcessor
+
+from ..ai_unit.chains.extraction_chain import EXTRACTION_CHAIN_VERSIONS
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionCache:
+    """
+    分块提取结果的本地持久化缓存
+
+    以 (分块内容哈希, schema 哈希, 提取模式及版本) 为键保存分块的提取结果，
+    重新提取同一课程时，文本与 schema 均未变化的分块不再调用大模型
+    """
+
+    def __init__(self, path: str | None):
+        self.path = path
+        self._initialized = False
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    @staticmethod
+    def make_key(chunk: List[Dict[str, Any]] | str, schema_hash: str, extraction_mode: str) -> str:
+        """
+        生成分块缓存键
+
+        :param chunk: 分块内容，通常是 chunk_with_overlap 切出的话语字典列表
+        :param schema_hash: 预先计算的 schema 哈希（见 schema_fragments）
+        :param extraction_mode: 提取模式
+        :return: 缓存键
+        """
+        chunk_hash = DialogueProcessor.content_hash(chunk)
+        version = EXTRACTION_CHAIN_VERSIONS.get(extraction_mode, "0")
+        return f"{chunk_hash}:{schema_hash}:{extraction_mode}-{version}"
+
+    async def get(self, key: str) -> Tuple[List, List] | None:
+        if not self.enabled:
+            return None
+        try:
+            return await asyncio.to_thread(self._get, key)
+        except Exception as e:
+            # 缓存不可用时退化为直接提取
+            logger.warning(f"读取分块提取缓存失败: {e}")
+            return None
+
+    async def set(self, key: str, result: Tuple[List, List]) -> None:
+        if not self.enabled:
+            return
+        try:
+            await asyncio.to_thread(self._set, key, result)
+        except Exception as e:
+            logger.warning(f"写入分块提取缓存失败: {e}")
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS chunk_extraction (cache_key TEXT PRIMARY KEY, result TEXT NOT NULL)")
+            self._initialized = True
+        return connection
+
+    def _get(self, key: str) -> Tuple[List, List] | None:
+        connection = self._connect()
+        try:
+            row = connection.execute("SELECT result FROM chunk_extraction WHERE cache_key = ?", (key,)).fetchone()
+        finally:
+            connection.close()
+        if row is None:
+            return None
+        kg, triple_source = json.loads(row[0])
+        return kg, triple_source
+
+    def _set(self, key: str, result: Tuple[List, List]) -> None:
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO chunk_extraction (cache_key, result) VALUES (?, ?)",
+                    (key, json.dumps(list(result), ensure_ascii=False)),
+                )
+        finally:
+            connection.close()
+
+
+# 设置 KG_EXTRACTION_CACHE_PATH 为空字符串可关闭缓存
+extraction_cache = ExtractionCache(path=os.getenv("KG_EXTRACTION_CACHE_PATH", "./cache/kg_extraction_cache.sqlite3"))
@@ -1,9 +1,12 @@
 import json
 import os
-from typing import List, Dict, Tuple
+from typing import AsyncIterator, List, Dict, Tuple
 
 from backend.common.core.rag.build_index.dialogue_process.dialogue_process import DialogueProcessor
 from ..ai_unit.executor.ai_executor import AIExecutor
+from ..ai_unit.query_template.extraction_templates import schema_fragments
+from .entity_resolution import EntityResolver
+from .extraction_cache import ExtractionCache, extraction_cache as default_extraction_cache
 import asyncio
 from tqdm import tqdm
 import logging
@@ -12,10 +15,16 @@ logger = logging.getLogger(__name__)
 
 
 class SemanticKGConstructor:
-    def __init__(self, kg_schema: List, schema_definition: Dict):
+    def __init__(self, kg_schema: List, schema_definition: Dict, extraction_mode: str = "chain",
+                 entity_resolver: EntityResolver | None = None, extraction_cache: ExtractionCache | None = None):
         self.kg_schema = self._convert_schema2old_format(kg_schema)
         # self.kg_schema = kg_schema
         self.schema_definition = schema_definition
+        # schema 派生的提示词片段与 schema 哈希只构建一次，所有分块的渲染和缓存键共用
+        self.schema_fragments = schema_fragments(self.kg_schema, schema_definition)
+        self.extraction_mode = extraction_mode
+        self.entity_resolver = entity_resolver if entity_resolver is not None else EntityResolver()
+        self.extraction_cache = extraction_cache if extraction_cache is not None else default_extraction_cache
         self.ai_executor = AIExecutor()
 
     @staticmethod
@@ -35,38 +44,108 @@ class SemanticKGConstructor:
 
     async def _process_chunk(self, chunk):
         """
-        处理文本块
+        处理文本块，文本与 schema 均未变化的分块直接复用缓存的提取结果
         """
+        cache_key = self.extraction_cache.make_key(chunk, self.schema_fragments["hash"], self.extraction_mode)
+        cached = await self.extraction_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         result = await self.ai_executor.execute(
             self,
             chunk=chunk,
             kg_schema=self.kg_schema,
             schema_definition=self.schema_definition,
+            schema_fragments=self.schema_fragments,
         )
+        # 空结果可能来自调用失败，不写入缓存，下次重新提取
+        if result and result[0]:
+            await self.extraction_cache.set(cache_key, result)
         return result
 
-    async def extract_kg(self, text_data: str) -> Tuple[List, List]:
+    async def iter_extract_kg(self, text_data: List[Dict]) -> AsyncIterator[Tuple[int, List, List]]:
         """
-        提取指定类型文件的KG
+        逐分块提取KG，每个分块完成后立即产出其三元组，不等待全部分块结束
+
+        :param text_data: 待提取的对话，话语字典列表
+        :return: 异步产出 (分块序号, kg_json_format, source_row_list)，顺序为完成顺序
         """
-        # 将文本字典解包，遍历每个键值对并对值进行类型判断，如果是列表则将其并入当前文本总列表中
         all_chunks = DialogueProcessor.chunk_with_overlap(dialogue=text_data)
 
-        kg = list()
-        triple_sources = list()
+        async def process(index, chunk):
+            return index, await self._process_chunk(chunk)
+
+        tasks = [asyncio.create_task(process(index, chunk)) for index, chunk in enumerate(all_chunks)]
+        try:
+            # 使用tqdm创建进度条
+            with tqdm(total=len(tasks), desc=f"Processing text chunks count {len(all_chunks)}") as pbar:
+                # 使用as_completed实时获取完成的任务
+                for completed_task in asyncio.as_completed(tasks):
+                    index, result = await completed_task
+                    pbar.update(1)
+                    # 分块内的重复三元组先合并，溯源文本去重
+                    kg, triple_sources = merge_chunk_triples([result])
+                    yield index, kg, triple_sources
+        finally:
+            # 调用方提前停止消费或出错时，取消尚未完成的分块，并等待其退出，避免遗留未取回的异常和写到一半的缓存
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def extract_kg(self, text_data: List[Dict]) -> Tuple[List, List]:
+        """
+        提取指定类型文件的KG
+        """
+        chunk_results = {}
+        async for index, kg, triple_sources in self.iter_extract_kg(text_data):
+            chunk_results[index] = (kg, triple_sources)
+
+        # 按分块顺序合并，保证合并结果与完成顺序无关
+        kg, triple_sources = merge_chunk_triples([chunk_results[index] for index in sorted(chunk_results)])
+
+        # 跨分块合并近似重复的实体
+        return await self.entity_resolver.resolve(kg, triple_sources)
+
+
+def merge_chunk_triples(chunk_results: List[Tuple[List, List]]) -> Tuple[List, List]:
+    """
+    合并各分块提取的三元组：重叠分块中重复出现的三元组（ID 相同）只保留一条，
+    其所有不同的溯源文本按出现顺序保留，缺失的实体属性由后出现的三元组补全
+
+    :param chunk_results: 按分块顺序排列的 (kg_json_format, source_row_list)
+    :return: 合并后的 kg 与 triple_sources
+    """
+    merged = {}
+    sources = {}
+    for triples, triple_source in chunk_results:
+        source_dict = {}
+        for row in triple_source or []:
+            source_dict.setdefault(row["ID"], []).append(row["TripleSource"])
+
+        for triple in triples or []:
+            triple_id = triple["ID"]
+            kept = merged.setdefault(triple_id, triple)
+            if kept is not triple:
+                for side in ("DirectionalEntity", "DirectedEntity"):
+                    _fill_missing_attributes(kept[side], triple[side])
 
-        # 创建任务列表
-        tasks = [self._process_chunk(chunk) for chunk in all_chunks]
+            spans = sources.setdefault(triple_id, [])
+            for span in source_dict.get(triple_id, []):
+                span = (span or "").strip()
+                if span and span not in spans:
+                    spans.append(span)
 
-        # 使用tqdm创建进度条
-        with tqdm(total=len(tasks), desc=f"Processing text chunks count {len(all_chunks)}") as pbar:
-            # 使用as_completed实时获取完成的任务
-            for completed_task in asyncio.as_completed(tasks):
-                triples, triple_source = await completed_task
-                if triples:  # 确保非空值被添加进容器中
-                    kg.extend(triples)
-                if triple_source:
-                    triple_sources.extend(triple_source)
+    kg = list(merged.values())
+    triple_sources = [{"ID": triple_id, "TripleSource": "\n".join(sources[triple_id])} for triple_id in merged]
+    return kg, triple_sources
 
 
-        return kg, triple_sources
\ No newline at end of file
+def _fill_missing_attributes(kept_entity: Dict, entity: Dict) -> None:
+    kept_attributes = kept_entity.get("Attributes")
+    attributes = entity.get("Attributes")
+    if not isinstance(kept_attributes, dict) or not isinstance(attributes, dict):
+        return
+    # 属性字典可能被同一分块内的多个三元组共用，补全时生成新字典而不是原地修改
+    filled = {key: value for key, value in attributes.items() if kept_attributes.get(key) in (None, "", "None", "Unknown")}
+    if filled:
+        kept_entity["Attributes"] = {**kept_attributes, **filled}
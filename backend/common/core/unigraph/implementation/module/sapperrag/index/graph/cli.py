@@ -8,14 +8,17 @@ from ...model.model_load import load_entities
 
 
 class GraphIndexer(Indexer):
-    async def build_index(self, entities, relationships, level: int):
+    async def build_index(self, entities, relationships, level: int, previous_communities=None, incremental: bool = True):
         """
         主要是创建社区报告和对实体信息进行嵌入
 
         :param entities: 实体列表
         :param relationships: 关系列表
         :param level: 社区划分的层数
-        :return: 实体列表，社区报告
+        :param previous_communities: 上次构建的社区列表（id、level、title、content、rating、attributes），
+                                     输入内容未变化的社区沿用上次的报告
+        :param incremental: 是否只重新划分受变更影响的连通分量
+        :return: 实体列表，需要保存的社区报告，社区变更计划
         """
         from backend.common.core.unigraph.interface.query_service import logger
         for entity in entities:
@@ -26,16 +29,28 @@ class GraphIndexer(Indexer):
             relationship.target = str(relationship.target)
             relationship.id = str(relationship.id)
 
+        previous_communities = previous_communities or []
+
         # 使用leiden算法对社区进行划分
         community_detector = CommunityDetection(max_comm_size=20, max_level=level, seed=5)
         vertices, edges = community_detector.load_data(entities, relationships)
         graph = community_detector.create_graph(vertices, edges)
-        communities = community_detector.detect_communities(graph, relationships)
+        subgraph, subgraph_vertex_ids, touched_relationships, component_of, kept, incremental = \
+            community_detector.split_touched_components(graph, relationships, previous_communities if incremental else [])
+        communities = []
+        if subgraph.vcount():
+            communities = await community_detector.adetect_communities(
+                subgraph, touched_relationships, vertex_ids=subgraph_vertex_ids)
+        communities, community_plan = community_detector.reconcile_communities(
+            communities, touched_relationships, component_of, previous_communities if incremental else [], kept)
+        community_plan["incremental"] = incremental
         entities = load_entities(entities=entities, communities=communities)
-        logger.info("社区划分完成😊")
+        logger.info(f"社区划分完成😊 重新划分关系 {len(touched_relationships)}/{len(relationships)} 条，"
+                    f"变化社区 {len(communities)} 个，保留社区 {len(community_plan['kept'])} 个")
 
         # 创建社区报告
-        generator = CommunityReportGenerator(input_data=communities)
+        generator = CommunityReportGenerator(input_data=communities,
+                                             previous_reports=self._previous_reports(previous_communities))
         reports_list = await generator.generate_reports()
         reports = [asdict(item) for item in reports_list]
         logger.info("社区报告生成完成😊")
@@ -46,4 +61,23 @@ class GraphIndexer(Indexer):
         entities = [asdict(item) for item in entities_list]
         logger.info("实体信息嵌入完成😊")
 
-        return entities, reports
+        return entities, reports, community_plan
+
+    @staticmethod
+    def _previous_reports(previous_communities):
+        """按输入内容哈希索引上次生成的报告"""
+        previous_reports = {}
+        for community in previous_communities:
+            content_hash = (community.get("attributes") or {}).get("content_hash")
+            if not content_hash:
+                continue
+            try:
+                rating = float(community.get("rating") or 0)
+            except ValueError:
+                rating = 0.0
+            previous_reports.setdefault(content_hash, {
+                "title": community.get("title", ""),
+                "full_content": community.get("content", ""),
+                "rating": rating,
+            })
+        return previous_reports
@@ -45,6 +45,7 @@ class KGProcessor:
                     type=relation.get("Type"),
                     name=relation.get("Name"),
                     attributes=relation.get("Attributes", {}),
+                    triple_source=relation.get("Source"),
                 ))
 
         entities = [
@@ -86,6 +87,7 @@ def transform_data(entities, relationships):
                 "id": rel.get('uuid', 'Unknown'),
                 "Type": rel.get('type', 'Unknown'),
                 "Name": rel.get('name', 'Unknown'),
+                "Source": rel.get('source'),
             },
             "DirectedEntity": {
                 "id": directed_entity.get('uuid', 'Unknown'),
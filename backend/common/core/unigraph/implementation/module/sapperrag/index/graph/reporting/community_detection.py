@@ -1,18 +1,69 @@
 import leidenalg as la
+import asyncio
 import json
+import logging
+import multiprocessing
+import os
+import threading
 import uuid
+from functools import partial
+from hashlib import sha256
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
 import igraph as ig
+import numpy as np
 from ....model.community import Community
 
+logger = logging.getLogger(__name__)
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def _shared_process_pool(workers):
+    """
+    获取进程内共用的进程池，首次使用时创建，之后各次构建复用，避免每次划分都重新启动子进程。
+    服务进程是多线程的，子进程以 spawn 方式启动而不是 fork
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _process_pool
+
+
+def _discard_process_pool(pool):
+    """丢弃已损坏的进程池，下次使用时重新创建"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _partition_subgraph(task):
+    """
+    进程池任务：由紧凑的边数组重建子图并递归划分，返回的划分结果以子图内顶点序号表示
+    """
+    vertex_count, edges, level, prefix, max_comm_size, max_level, seed = task
+    subgraph = CommunityDetection.create_graph(vertex_count, edges)
+    detector = CommunityDetection(max_comm_size=max_comm_size, max_level=max_level, seed=seed, workers=1)
+    return detector.recursive_leiden(subgraph, level, prefix)
+
 
 class CommunityDetection:
-    def __init__(self, max_comm_size=20, max_level=0, seed=None):
+    parallel_threshold = 32  # 子社区数量达到该值时才使用进程池，任务过少时进程开销得不偿失
+
+    def __init__(self, max_comm_size=20, max_level=0, seed=None, workers=None):
         # 初始化社区检测参数
         self.max_comm_size = max_comm_size
         self.max_level = max_level
         self.seed = seed
+        self.workers = workers or os.cpu_count() or 1
         self.node_details_map = {}  # 存储节点详细信息的映射
-        self.node_id_map = {}  # 存储节点ID的映射
+        self.vertex_ids = np.empty(0, dtype=object)  # 顶点序号 -> 实体ID
+        self.edges = np.empty((0, 2), dtype=np.int32)  # 与关系列表一一对应的边（顶点序号对）
 
     @staticmethod
     def calculate_and_update_degrees(entities, relationships) -> list:
@@ -44,78 +95,83 @@ class CommunityDetection:
 
         return entities
 
-    def recursive_leiden(self, graph, level=0, prefix='', node_map=None):
+    def recursive_leiden(self, graph, level=0, prefix=''):
         """
         递归地应用Leiden算法进行社区检测
 
         :param graph: 图对象
         :param level: 当前递归层次
         :param prefix: 前缀
-        :param node_map: 节点映射
-        :return: 节点层次和社区信息
+        :return: 划分结果列表，每项为 (层次, 社区名前缀, 顶点序号数组, 社区编号数组)，
+                 顶点 vertices[i] 属于社区 f"{prefix}L{level}_C{membership[i]}"
         """
         if level > self.max_level:
-            return {}, {}
-
-        if node_map is None:
-            node_map = {v.index: v.index for v in graph.vs}
+            return []
 
         partition = la.find_partition(graph, partition_type=la.ModularityVertexPartition, seed=self.seed)
-        communities = partition.membership
-
-        levels = {node_map[v.index]: [] for v in graph.vs}
-        community_info = {node_map[v.index]: [] for v in graph.vs}
-
-        for v in graph.vs:
-            levels[node_map[v.index]].append(level)
-            community_info[node_map[v.index]].append(f"{prefix}L{level}_C{communities[v.index]}")
+        membership = np.asarray(partition.membership, dtype=np.int32)
+        partitions = [(level, prefix, np.arange(graph.vcount(), dtype=np.int32), membership)]
 
         # 当 level == self.max_level 时，停止递归并只处理当前层次的社区
         if level == self.max_level:
-            return levels, community_info
-
-        for community in set(communities):
-            subgraph_indices = [v.index for v in graph.vs if communities[v.index] == community]
-            subgraph = graph.subgraph(subgraph_indices)
-            sub_node_map = {subgraph.vs[i].index: node_map[subgraph_indices[i]] for i in range(len(subgraph.vs))}
-
-            if 1 < len(subgraph.vs) <= self.max_comm_size:
-                sub_prefix = f"{prefix}L{level}_C{community}_"
-                sub_levels, sub_community_info = self.recursive_leiden(subgraph, level + 1, sub_prefix, sub_node_map)
-
-                for v in subgraph.vs:
-                    if sub_node_map[v.index] not in sub_levels:
-                        sub_levels[sub_node_map[v.index]] = []
-                    if sub_node_map[v.index] not in sub_community_info:
-                        sub_community_info[sub_node_map[v.index]] = []
-
-                for v in subgraph.vs:
-                    levels[sub_node_map[v.index]].extend(sub_levels[sub_node_map[v.index]])
-                    community_info[sub_node_map[v.index]].extend(sub_community_info[sub_node_map[v.index]])
+            return partitions
+
+        # 稳定排序后按社区切分，各社区内顶点序号升序，与 graph.subgraph 中的顶点顺序一致
+        groups = np.split(np.argsort(membership, kind='stable'), np.cumsum(np.bincount(membership))[:-1])
+
+        sub_tasks = []
+        for community, subgraph_indices in enumerate(groups):
+            if 1 < len(subgraph_indices) <= self.max_comm_size:
+                subgraph = graph.subgraph(subgraph_indices.tolist())
+                sub_tasks.append((subgraph_indices, (
+                    subgraph.vcount(), np.asarray(subgraph.get_edgelist(), dtype=np.int32).reshape(-1, 2), level + 1, f"{prefix}L{level}_C{community}_",
+                    self.max_comm_size, self.max_level, self.seed,
+                )))
+
+        # 各子社区的划分相互独立且使用固定种子，结果按社区顺序合并，与串行执行一致
+        results = self._partition_subgraphs([task for _, task in sub_tasks])
+        for (subgraph_indices, _), sub_partitions in zip(sub_tasks, results):
+            # 子图内的顶点序号经数组索引映射回当前图的顶点序号
+            for sub_level, sub_prefix, sub_vertices, sub_membership in sub_partitions:
+                partitions.append((sub_level, sub_prefix, subgraph_indices[sub_vertices], sub_membership))
+
+        return partitions
+
+    def _partition_subgraphs(self, tasks):
+        """
+        划分子社区：任务较多时分发到共用的进程池，子图以 (顶点数, 边数组) 的形式传递，任务较少时在当前进程内划分
 
-        return levels, community_info
+        :param tasks: _partition_subgraph 的任务参数列表
+        :return: 与 tasks 顺序一致的划分结果列表
+        """
+        if self.workers > 1 and len(tasks) >= self.parallel_threshold:
+            chunksize = max(1, len(tasks) // (self.workers * 4))
+            pool = _shared_process_pool(self.workers)
+            try:
+                return list(pool.map(_partition_subgraph, tasks, chunksize=chunksize))
+            except BrokenProcessPool as e:
+                logger.warning(f"社区划分进程池不可用，改为在当前进程内划分: {e}")
+                _discard_process_pool(pool)
+        return [_partition_subgraph(task) for task in tasks]
 
     def load_data(self, entities, relationships):
         """
         加载数据并创建图对象
 
+        实体ID映射为连续的整数顶点序号，顶点序号与实体ID的对应关系保存在 numpy 数组中
+
         :param entities: 实体列表
         :param relationships: 关系列表
-        :return: 节点列表和边列表
+        :return: 顶点序号 -> 实体ID 的数组和边数组
         """
         entities = self.calculate_and_update_degrees(entities, relationships)
 
-        vertices = set()
-        edges = []
-
-        for relationship in relationships:
-            directional_entity = relationship.source
-            directed_entity = relationship.target
-
-            vertices.add(directional_entity)
-            vertices.add(directed_entity)
-
-            edges.append((directional_entity, directed_entity))
+        endpoints = np.array([(relationship.source, relationship.target) for relationship in relationships],
+                             dtype=object).reshape(-1, 2)
+        # 排序去重得到顶点表，return_inverse 直接给出每个端点的顶点序号
+        vertex_ids, inverse = np.unique(endpoints.astype(str), return_inverse=True)
+        self.vertex_ids = vertex_ids.astype(object)
+        self.edges = inverse.reshape(-1, 2).astype(np.int32)
 
         for entity in entities:
             self.node_details_map[entity.id] = {
@@ -123,53 +179,202 @@ class CommunityDetection:
                 "name": entity.name,
                 "type": entity.type
             }
-            self.node_id_map[entity.id] = entity.id
 
-        return list(vertices), edges
+        return self.vertex_ids, self.edges
 
     @staticmethod
     def create_graph(vertices, edges):
-        # 创建图对象并添加节点和边
-        g = ig.Graph(directed=False)
-        g.add_vertices(vertices)
-        g.add_edges(edges)
-        return g
+        """
+        由顶点数（或顶点表）与整数边数组创建图对象，不设置顶点名称
+
+        :param vertices: 顶点数或顶点序号 -> 实体ID 的数组
+        :param edges: 形状为 (边数, 2) 的整数边数组
+        :return: 图对象
+        """
+        vertex_count = vertices if isinstance(vertices, int) else len(vertices)
+        return ig.Graph(n=vertex_count, edges=np.asarray(edges, dtype=np.int32).reshape(-1, 2), directed=False)
+
+    def split_touched_components(self, graph, relationships, previous_communities):
+        """
+        增量划分：按连通分量比较本次与上次构建的图，找出被新增、删除或修改的关系与实体影响的连通分量
+
+        连通分量的签名由划分参数、分量内全部关系的内容摘要（ID、名称、类型、属性、溯源文本）
+        与全部实体的内容摘要（ID、名称、类型、属性）计算，签名与上次相同的分量划分结果与报告输入都不变，
+        只有签名变化（或新出现）的分量需要重新划分
+
+        :param graph: 全图（由 load_data 的结果创建）
+        :param relationships: 关系列表
+        :param previous_communities: 上次构建的社区列表，每项包含 id、level 与 attributes（含 component 签名）
+        :return: 待重新划分的子图、子图顶点序号 -> 实体ID 的数组、子图内的关系、实体 -> 所在分量签名、
+                 签名未变化而保留的社区 ID、是否为增量划分；
+                 没有上次的社区或上次的社区缺少签名时无法增量，全部分量都重新划分
+        """
+        previous_signatures = set()
+        for community in previous_communities:
+            signature = (community.get("attributes") or {}).get("component")
+            if not signature:
+                previous_signatures = set()
+                break
+            previous_signatures.add(signature)
+        incremental = bool(previous_signatures)
+
+        membership = np.asarray(graph.connected_components().membership, dtype=np.int32)
+        relationship_component = membership[self.edges[:, 0]]
+
+        component_digests = {}
+        for relationship, component in zip(relationships, relationship_component.tolist()):
+            component_digests.setdefault(component, []).append(self._relationship_digest(relationship))
+        for entity_id, component in zip(self.vertex_ids.tolist(), membership.tolist()):
+            component_digests[component].append(self._entity_digest(entity_id))
+        parameters = f"{self.max_comm_size}:{self.max_level}:{self.seed}"
+        signatures = np.empty(len(component_digests), dtype=object)
+        for component, digests in component_digests.items():
+            signatures[component] = sha256("\n".join([parameters] + sorted(digests)).encode("utf-8")).hexdigest()
+
+        touched = np.array([signature not in previous_signatures for signature in signatures], dtype=bool)
+        component_of = dict(zip(self.vertex_ids.tolist(), signatures[membership].tolist()))
+        current_signatures = set(signatures.tolist())
+        kept = [community["id"] for community in previous_communities
+                if incremental and community["attributes"]["component"] in current_signatures]
+
+        touched_vertices = np.flatnonzero(touched[membership])
+        subgraph = graph.subgraph(touched_vertices.tolist())
+        touched_relationships = [relationship for relationship, is_touched in zip(relationships, touched[relationship_component].tolist())
+                                 if is_touched]
+        return subgraph, self.vertex_ids[touched_vertices], touched_relationships, component_of, kept, incremental
+
+    def _entity_digest(self, entity_id) -> str:
+        """实体内容摘要，由 load_data 计算的度数不计入（度数由关系决定，关系已计入摘要）"""
+        details = self.node_details_map.get(entity_id, {})
+        attributes = details.get("attributes")
+        if isinstance(attributes, dict):
+            attributes = {key: value for key, value in attributes.items() if key != "degree"}
+        content = [entity_id, details.get("name"), details.get("type"), attributes]
+        return sha256(json.dumps(content, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _relationship_digest(relationship) -> str:
+        """关系内容摘要，关系的溯源文本或属性被更新时摘要随之变化"""
+        content = [relationship.id, relationship.name, relationship.type, relationship.attributes,
+                   relationship.triple_source]
+        return sha256(json.dumps(content, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def reconcile_communities(self, communities, relationships, component_of, previous_communities, kept):
+        """
+        为重新划分得到的社区写入签名，并与上次的社区对齐：
+        同层成员不变的社区沿用上次的社区 ID，成员与关联关系的内容都不变的社区连同报告一起保留，
+        只有新增社区和成员不变但关联关系或实体内容变化的社区需要重新生成报告
+
+        :param communities: 重新划分得到的社区列表
+        :param relationships: 重新划分的子图内的关系
+        :param component_of: 实体 -> 所在分量签名
+        :param previous_communities: 上次构建的社区列表
+        :param kept: 签名未变化而保留的社区 ID
+        :return: 需要生成报告的社区列表与社区变更计划（保留、沿用 ID、仅更新签名、删除的社区）
+        """
+        entity_relationships = {}
+        for relationship in relationships:
+            digest = self._relationship_digest(relationship)
+            entity_relationships.setdefault(relationship.source, []).append(digest)
+            entity_relationships.setdefault(relationship.target, []).append(digest)
+
+        kept_ids = set(kept)
+        previous_by_members = {}
+        for community in previous_communities:
+            if community["id"] not in kept_ids:
+                attributes = community["attributes"]
+                previous_by_members[(str(community["level"]), attributes.get("members"))] = community
+
+        changed, reused, retagged = [], {}, {}
+        for community in communities:
+            entity_ids = sorted(community.entity_ids)
+            # edges 覆盖社区关联关系与成员实体的内容，内容变化时报告需要重新生成
+            content_digests = sorted({digest for entity_id in entity_ids for digest in entity_relationships.get(entity_id, [])})
+            content_digests += [self._entity_digest(entity_id) for entity_id in entity_ids]
+            community.attributes = {
+                "component": component_of[entity_ids[0]],
+                "members": sha256("\n".join(entity_ids).encode("utf-8")).hexdigest(),
+                "edges": sha256("\n".join(content_digests).encode("utf-8")).hexdigest(),
+            }
+            previous = previous_by_members.pop((str(community.level), community.attributes["members"]), None)
+            if previous is None:
+                changed.append(community)
+            elif previous["attributes"].get("edges") == community.attributes["edges"]:
+                # 报告无需重新生成，但所在分量的签名已变化，需要更新保存的签名，其余已保存的属性不变
+                retagged[previous["id"]] = {**previous["attributes"], **community.attributes}
+            else:
+                reused[community.id] = previous["id"]
+                changed.append(community)
+
+        plan = {
+            "kept": kept + list(retagged),
+            "reused": reused,
+            "retagged": retagged,
+            "deleted": [community["id"] for community in previous_by_members.values()],
+        }
+        return changed, plan
+
+    async def adetect_communities(self, graph, relationships, show: bool = False, vertex_ids=None):
+        """
+        在线程池中执行 detect_communities，Leiden 划分与等待进程池的过程不阻塞事件循环
 
-    def detect_communities(self, graph, relationships, show: bool = False):
+        :param graph: 图对象
+        :param relationships: 关系列表
+        :param show: 是否用于展示于知识图谱
+        :param vertex_ids: 图的顶点序号 -> 实体ID 的数组，默认为 load_data 得到的全图顶点表
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, partial(self.detect_communities, graph, relationships, show=show, vertex_ids=vertex_ids))
+
+    def detect_communities(self, graph, relationships, show: bool = False, vertex_ids=None):
         """
         检测社区并返回社区信息的 DataFrame
 
         :param graph: 图对象
         :param relationships: 关系列表
         :param show: 是否用于展示于知识图谱
+        :param vertex_ids: 图的顶点序号 -> 实体ID 的数组，默认为 load_data 得到的全图顶点表
         """
-        levels, community_info = self.recursive_leiden(graph)
+        if vertex_ids is None:
+            vertex_ids = self.vertex_ids
+        partitions = self.recursive_leiden(graph)
 
         data = []
         community_save = {}
-
-        # 初始化社区信息
-        for node in graph.vs:
-            node_name = node["name"] if "name" in node.attributes() else node.index
-            node_id = self.node_id_map.get(node_name, -1)
-
-            for level, community in zip(levels[node.index], community_info[node.index]):
-                if community not in community_save:
-                    community_save[community] = {
-                        "entity_ids": [],
-                        "community_info": [],
-                        "level": level,
-                        "title": community,
-                        "id": community,
-                        "rating": 0,
-                    }
-                community_save[community]["entity_ids"].append(node_id)
+        entity_communities = {}  # 实体 -> 所属社区的倒排索引
+
+        # 初始化社区信息：按社区编号稳定排序后切分，得到各社区的实体
+        for level, prefix, vertices, membership in partitions:
+            order = np.argsort(membership, kind='stable')
+            groups = np.split(vertices[order], np.cumsum(np.bincount(membership))[:-1])
+            for community_index, members in enumerate(groups):
+                if not len(members):
+                    continue
+                community = f"{prefix}L{level}_C{community_index}"
+                entity_ids = vertex_ids[members].tolist()
+                community_save[community] = {
+                    "entity_ids": entity_ids,
+                    "community_info": [],
+                    "level": level,
+                    "title": community,
+                    "id": community,
+                    "rating": 0,
+                }
+                for entity_id in entity_ids:
+                    entity_communities.setdefault(entity_id, []).append(community)
         if not show:
             # 处理关系信息
             for relationship in relationships:
                 directional_entity = relationship.source
                 directed_entity = relationship.target
 
+                # 通过倒排索引找到关系首尾实体所属的社区，同一社区只分配一次
+                communities = dict.fromkeys(
+                    entity_communities.get(directional_entity, []) + entity_communities.get(directed_entity, []))
+                if not communities:
+                    continue
+
                 directional_entity_details = self.node_details_map.get(directional_entity, {})
                 directed_entity_details = self.node_details_map.get(directed_entity, {})
                 relation_details = {
@@ -193,12 +398,10 @@ class CommunityDetection:
                     }
                 }
 
-                # 将关系分配到对应的社区
-                for community, info in community_save.items():
-                    if directional_entity in info["entity_ids"] or directed_entity in info["entity_ids"]:
-                        # 在存储前序列化为字符串
-                        serialized_relation_entry = json.dumps(relation_entry, ensure_ascii=False)
-                        info["community_info"].append(serialized_relation_entry)
+                # 关系只序列化一次（并编码为 JSON 字符串元素），各社区共享同一个字符串
+                serialized_relation_entry = json.dumps(json.dumps(relation_entry, ensure_ascii=False), ensure_ascii=False)
+                for community in communities:
+                    community_save[community]["community_info"].append(serialized_relation_entry)
 
         # 构建最终社区信息
         for key, value in community_save.items():
@@ -208,14 +411,17 @@ class CommunityDetection:
                     entity_ids=value["entity_ids"],
                     id=str(uuid.uuid4())[:8],
                     title=value['title'],
-                    # 将 community_info 列表直接序列化为 JSON 字符串存储
-                    full_content=json.dumps(value["community_info"], ensure_ascii=False, indent=4),
+                    # 与 json.dumps(community_info, ensure_ascii=False, indent=4) 的输出一致，只需一次拼接
+                    full_content=self._join_content(value["community_info"]),
                     rating=0.0
                 )
             )
 
         return data
 
-
-
-
+    @staticmethod
+    def _join_content(serialized_entries: list) -> str:
+        """将已编码为 JSON 字符串的关系条目拼接为缩进为 4 的 JSON 数组"""
+        if not serialized_entries:
+            return "[]"
+        return "[\n    " + ",\n    ".join(serialized_entries) + "\n]"
@@ -1,6 +1,7 @@
 import asyncio
 import json
 import logging
+from hashlib import sha256
 
 from tqdm.asyncio import tqdm_asyncio
 
@@ -12,10 +13,20 @@ logger = logging.getLogger(__name__)
 
 
 class CommunityReportGenerator:
-    def __init__(self, input_data):
+    def __init__(self, input_data, previous_reports=None):
+        """
+        :param input_data: 社区列表
+        :param previous_reports: 上次生成的报告，输入内容哈希 -> {"title", "full_content", "rating"}
+        """
         self.input_data = input_data
+        self.previous_reports = previous_reports or {}
         self.prompt_template = REPORT_GENERATE
 
+    @staticmethod
+    def content_hash(content: str) -> str:
+        """计算社区输入内容的哈希，与报告一同保存在社区属性中"""
+        return sha256(content.encode('utf-8')).hexdigest()
+
     async def _process_single_community(self, index, community_df, llm, max_retries):
         """
         带指数退避的重试机制处理单个社区
@@ -65,6 +76,20 @@ class CommunityReportGenerator:
         llm = GenericResponseGetter()
         semaphore = asyncio.Semaphore(concurrent_tasks)  # 控制并发量
 
+        # 输入内容与上次完全相同的社区直接沿用上次的报告，只为新增或内容变化的社区调用大模型
+        pending = []
+        for index, community in enumerate(self.input_data):
+            content_hash = self.content_hash(community.full_content)
+            community.attributes = {**(community.attributes or {}), "content_hash": content_hash}
+            previous = self.previous_reports.get(content_hash)
+            if previous is None:
+                pending.append((index, community))
+                continue
+            community.title = previous["title"]
+            community.full_content = previous["full_content"]
+            community.rating = previous["rating"]
+        logger.info(f"社区报告: 沿用 {len(self.input_data) - len(pending)} 个，重新生成 {len(pending)} 个")
+
         async def bounded_task(index, community):
             async with semaphore:
                 return await self._process_single_community(index, community, llm, max_retries)
@@ -72,7 +97,7 @@ class CommunityReportGenerator:
         # 创建任务列表
         tasks = [
             bounded_task(index, community)
-            for index, community in enumerate(self.input_data)
+            for index, community in pending
         ]
 
         # 使用带进度条的并发执行
@@ -0,0 +1,65 @@
+import logging
+import os
+from pathlib import Path
+
+from jinja2 import Template
+
+logger = logging.getLogger(__name__)
+
+
+class PromptRegistry:
+    """
+    提示词注册表：按包内路径加载目录下的全部 .txt 提示词，启动时编译一次
+
+    开启 auto_reload 后，每次取用模板时检查文件修改时间，文件变化即重新编译，便于调试提示词
+    """
+
+    def __init__(self, directory: Path, auto_reload: bool = False):
+        self.directory = Path(directory)
+        self.auto_reload = auto_reload
+        self._templates: dict[str, tuple[float, Template]] = {}
+        for path in sorted(self.directory.glob("*.txt")):
+            self._load(path.stem)
+
+    def get(self, name: str) -> Template:
+        """
+        获取已编译的提示词模板
+
+        :param name: 提示词文件名（不含 .txt 后缀）
+        :return: jinja2 模板
+        """
+        entry = self._templates.get(name)
+        if entry is None:
+            return self._load(name)
+        if self.auto_reload:
+            mtime = self._path(name).stat().st_mtime
+            if mtime != entry[0]:
+                logger.info(f"提示词 {name} 已修改，重新加载")
+                return self._load(name)
+        return entry[1]
+
+    def render(self, name: str, **kwargs) -> str:
+        """
+        渲染提示词
+
+        :param name: 提示词文件名（不含 .txt 后缀）
+        :param kwargs: 模板参数
+        :return: 渲染后的提示词
+        """
+        return self.get(name).render(**kwargs)
+
+    def _path(self, name: str) -> Path:
+        return self.directory / f"{name}.txt"
+
+    def _load(self, name: str) -> Template:
+        path = self._path(name)
+        template = Template(path.read_text(encoding="utf-8"))
+        self._templates[name] = (path.stat().st_mtime, template)
+        return template
+
+
+# 设置 PROMPT_AUTO_RELOAD=1 可在修改提示词文件后无需重启即生效
+schema_prompts = PromptRegistry(
+    Path(__file__).resolve().parent / "prompt",
+    auto_reload=os.getenv("PROMPT_AUTO_RELOAD", "").lower() in ("1", "true"),
+)
@@ -1,6 +1,6 @@
 import asyncio
 import numpy as np
-from typing import List, Dict
+from typing import List, Dict, Iterable, Tuple
 
 from backend.common.core.llm.response_getter import GenericResponseGetter
 
@@ -30,6 +30,64 @@ async def batch_get_vectors(words: List[str]) -> Dict[str, List[float]]:
     # 将单词和对应向量组合成字典
     return dict(zip(words, embeddings))
 
+class TypeVectorIndex:
+    """
+    类型名称向量索引：每个名称只嵌入一次，向量归一化后按行保存，
+    所有待匹配名称与候选名称的相似度通过一次矩阵乘法得到
+    """
+
+    def __init__(self, batch_size: int = 64):
+        self.batch_size = batch_size
+        self._rows: Dict[str, int] = {}
+        self._vectors: List[np.ndarray] = []
+        self._matrix: np.ndarray | None = None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._rows
+
+    async def add(self, names: Iterable[str]) -> None:
+        """
+        嵌入索引中尚不存在的名称，多个名称合并为批量嵌入请求
+
+        参数:
+            names: 类型名称
+        """
+        new_names = [name for name in dict.fromkeys(names) if name not in self._rows]
+        if not new_names:
+            return
+        batches = [new_names[i:i + self.batch_size] for i in range(0, len(new_names), self.batch_size)]
+        results = await asyncio.gather(*(GenericResponseGetter.get_vectors(queries=batch) for batch in batches))
+        for name, vector in zip(new_names, (vector for batch in results for vector in batch)):
+            vector = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            self._rows[name] = len(self._vectors)
+            self._vectors.append(vector / norm if norm else vector)
+        self._matrix = None
+
+    def best_matches(self, queries: List[str], candidates: List[str]) -> List[Tuple[str | None, float]]:
+        """
+        为每个待匹配名称找到余弦相似度最高的候选名称，名称需已加入索引
+
+        参数:
+            queries: 待匹配的名称
+            candidates: 候选名称
+
+        返回:
+            与 queries 顺序一致的 (最相似的候选名称, 相似度)，没有候选时为 (None, 0.0)
+        """
+        if not queries:
+            return []
+        if not candidates:
+            return [(None, 0.0)] * len(queries)
+        if self._matrix is None:
+            self._matrix = np.vstack(self._vectors)
+        query_matrix = self._matrix[[self._rows[name] for name in queries]]
+        candidate_matrix = self._matrix[[self._rows[name] for name in candidates]]
+        similarity = query_matrix @ candidate_matrix.T
+        best = similarity.argmax(axis=1)
+        return [(candidates[j], float(similarity[i, j])) for i, j in enumerate(best.tolist())]
+
+
 def cosine_similarity(vector_a: List[float], vector_b: List[float]) -> float:
     """
     Calculate the cosine similarity between two vectors.
@@ -1,21 +1,35 @@
+import asyncio
 import json
+from functools import lru_cache
 
-from jinja2 import Template
+import tiktoken
 
 from backend.common.core.llm.response_getter import GenericResponseGetter
 from backend.common.core.rag.build_index.dialogue_process.dialogue_process import DialogueProcessor
+from backend.common.core.unigraph.implementation.module.schema_construction.prompt_registry import schema_prompts
+from backend.common.core.unigraph.implementation.module.schema_construction.related_retrieve import TypeVectorIndex
+from backend.common.core.unigraph.implementation.module.sapperrag.utils import num_tokens
 from backend.common.core.unigraph.implementation.module.schema_construction.utils import deduplicate_schema, extract_definition, extract_triples_and_strings, get_new_entity_types_from_response, \
     merge_type_dicts_with_semantic, get_new_relationship_types_from_response, get_entity_type_attributes_from_response, \
-    transform_triplets_to_schema
+    transform_triplets_to_schema, build_type_lookup
+
+
+@lru_cache(maxsize=1)
+def _token_encoder():
+    return tiktoken.get_encoding("cl100k_base")
 
 
 class SchemaConstruction:
+    definition_batch_tokens = 1000  # 每批类型定义输入的 token 上限
+    definition_batch_items = 20  # 每批最多包含的类型数
+
     def __init__(self, kg_schema, definition):
         self.kg_schema = kg_schema
         self.definition = definition
         self.suggestion = ""
         self.entity_type_dict = {}  # 用于存储实体类型及其实例的字典
         self.relation_type_dict = {}  # 用于存储关系类型及其实例的字典
+        self.type_index = TypeVectorIndex()  # 类型名称向量索引，每个类型名称只嵌入一次
 
     async def chatresponse(self, prompt):
         response = await GenericResponseGetter.get_response(query=prompt)
@@ -28,16 +42,23 @@ class SchemaConstruction:
             directional_suggestion: str,
     ) -> object:
         text_data_list = json.loads(text_data)
+        chunks = []
         for dialogue in text_data_list:
             filter_chunks = DialogueProcessor.chunk_with_overlap(dialogue=dialogue.get("identification_result", "no context"))
-            print(filter_chunks)
-            for chunk in filter_chunks:
-                await self.extract_kg_schema(
-                    text=chunk,
-                    aim=aim,
-                    directional_suggestion=directional_suggestion,
-                    language="Chinese",
-                )
+            chunks.extend(filter_chunks)
+
+        # 各分块相互独立，并发提取；LLM 并发由全局 llm_limiter 统一限制，gather 保证结果按分块顺序返回
+        chunk_results = await asyncio.gather(*(
+            self.extract_kg_schema(
+                text=chunk,
+                aim=aim,
+                directional_suggestion=directional_suggestion,
+                language="Chinese",
+            )
+            for chunk in chunks
+        ))
+        await self.merge_chunk_results(chunk_results, language="Chinese")
+
         # 对schema中的元素进行去重
         self.kg_schema = deduplicate_schema(self.kg_schema)
         # 过滤掉 source 为空字典的元素
@@ -47,58 +68,42 @@ class SchemaConstruction:
 
     # 对实体类型和关系类型进行定义
     async def type_definition(self, language="Chinese"):
-        # ========= 实体类型定义（每10个键一批） =========
-        entity_items = list(self.entity_type_dict.items())
-        for i in range(0, len(entity_items), 10):
-            batch = entity_items[i:i + 10]
-
-            # 拼接当前批次的输入字符串
-            batch_str = "\n".join(
-                f"{key}: {', '.join(values)}" for key, values in batch
-            )
-
-            # 加载实体类型定义的提示词模板
-            entity_type_define_prompt = Template(
-                open("common/core/unigraph/implementation/module/schema_construction/prompt/entity_type_define_agent.txt", "r", encoding="utf-8").read()
-                # open("backend_temp/common/implementation/implementation/module/schema_construction/prompt/entity_type_define_agent.txt", "r", encoding="utf-8").read()
-            )
-            # 渲染提示词，填入实体类型字典字符串
-            entity_type_define_prompt = entity_type_define_prompt.render(
-                entity_type_dict_string=batch_str
-            )
-
-            # 调用大模型生成定义
-            entity_type_define_response = await self.chatresponse(entity_type_define_prompt)
-
-            # 解析响应并更新定义
-            self.definition.update(extract_definition(entity_type_define_response))
-
-        # ========= 关系类型定义（每10个键一批） =========
-        relation_items = list(self.relation_type_dict.items())
-        for i in range(0, len(relation_items), 10):
-            batch = relation_items[i:i + 10]
-
-            # 拼接当前批次的输入字符串
-            batch_str = "\n".join(
-                f"{key}: {', '.join(values)}" for key, values in batch
-            )
-
-            # 加载关系类型定义的提示词模板
-            relation_type_define_prompt = Template(
-                open("common/core/unigraph/implementation/module/schema_construction/prompt/relation_type_define_agent.txt", "r", encoding="utf-8").read()
-            # open("backend_temp/common/implementation/implementation/module/schema_construction/prompt/relation_type_define_agent.txt", "r",encoding="utf-8").read()
-            )
-            # 渲染提示词，填入关系类型字典字符串
-            relation_type_define_prompt = relation_type_define_prompt.render(
-                relation_type_dict_string=batch_str,
-                language=language
-            )
-
-            # 调用大模型生成定义
-            relation_type_define_response = await self.chatresponse(relation_type_define_prompt)
-
-            # 解析响应并更新定义
-            self.definition.update(extract_definition(relation_type_define_response))
+        # 实体类型与关系类型的各批次相互独立，全部并发发出，LLM 并发由全局 llm_limiter 统一限制
+        prompts = [
+            schema_prompts.render("entity_type_define_agent", entity_type_dict_string=batch_str)
+            for batch_str in self._definition_batches(self.entity_type_dict)
+        ]
+        prompts += [
+            schema_prompts.render("relation_type_define_agent", relation_type_dict_string=batch_str, language=language)
+            for batch_str in self._definition_batches(self.relation_type_dict)
+        ]
+        responses = await asyncio.gather(*(self.chatresponse(prompt) for prompt in prompts))
+
+        # 按批次顺序解析响应并更新定义
+        for response in responses:
+            self.definition.update(extract_definition(response))
+
+    def _definition_batches(self, type_dict):
+        """
+        按 token 长度自适应分批：每批输入不超过 definition_batch_tokens 个 token 且不超过 definition_batch_items 个类型，
+        实例较少的类型合并为较大的批次，实例很多的类型单独成批
+
+        :param type_dict: 类型 -> 实例列表
+        :return: 各批次的输入字符串
+        """
+        token_encoder = _token_encoder()
+        batches, lines, batch_tokens = [], [], 0
+        for key, values in type_dict.items():
+            line = f"{key}: {', '.join(values)}"
+            line_tokens = num_tokens(line, token_encoder)
+            if lines and (batch_tokens + line_tokens > self.definition_batch_tokens or len(lines) >= self.definition_batch_items):
+                batches.append("\n".join(lines))
+                lines, batch_tokens = [], 0
+            lines.append(line)
+            batch_tokens += line_tokens
+        if lines:
+            batches.append("\n".join(lines))
+        return batches
 
     async def extract_kg_schema(
             self,
@@ -107,13 +112,9 @@ class SchemaConstruction:
             directional_suggestion,
             language="Chinese"
     ):
-        extract_triples_from_text_prompt = Template(
-            open(r"common/core/unigraph/implementation/module/schema_construction/prompt/extract_triples_from_text_agent.txt", "r", encoding="utf-8").read()
-            # open(r"backend_temp/common/implementation/implementation/module/schema_construction/prompt/extract_triples_from_text_agent.txt", "r",encoding="utf-8").read()
-        )
-
         # 第一次调用大模型
-        extract_triples_from_text_prompt = extract_triples_from_text_prompt.render(
+        extract_triples_from_text_prompt = schema_prompts.render(
+            "extract_triples_from_text_agent",
             text=text,
             aim=aim,
             directional_suggestion=directional_suggestion,
@@ -127,48 +128,53 @@ class SchemaConstruction:
         # 从文本中提取三元组以及实体和关系
         Triple_source_dict, entity_string, relation_string = extract_triples_and_strings(extract_triples_from_text_response)
 
-        entity_classify_prompt = Template(
-            open("common/core/unigraph/implementation/module/schema_construction/prompt/entity_classify_agent.txt", "r", encoding="utf-8").read()
-            # open("backend_temp/common/implementation/implementation/module/schema_construction/prompt/entity_classify_agent.txt", "r", encoding="utf-8").read()
+        entity_classify_prompt = schema_prompts.render("entity_classify_agent", entity_string=entity_string, language=language)
+        relation_classify_prompt = schema_prompts.render("relation_classify_agent", relation_string=relation_string, language=language)
+
+        # 实体分类与关系分类只依赖本分块的三元组，两次调用并行
+        entity_classify_response, relation_classify_response = await asyncio.gather(
+            self.chatresponse(entity_classify_prompt),
+            self.chatresponse(relation_classify_prompt),
         )
 
-        entity_classify_prompt = entity_classify_prompt.render(entity_string=entity_string, language=language)
+        # 只返回本分块的结果，不修改共享状态，由 merge_chunk_results 统一合并
+        return (
+            Triple_source_dict,
+            get_new_entity_types_from_response(response=entity_classify_response),
+            get_new_relationship_types_from_response(response=relation_classify_response),
+        )
 
-        entity_classify_response = await self.chatresponse(entity_classify_prompt)
+    async def merge_chunk_results(self, chunk_results, language="Chinese"):
+        """
+        按分块顺序合并各分块的实体类型字典与关系类型字典，合并结果与分块完成顺序无关；
+        合并完成后对全部实体类型做一次属性推理，再将各分块的三元组转换为schema
+        """
+        for _, chunk_entity_type_dict, chunk_relation_type_dict in chunk_results:
+            self.entity_type_dict = await self._merge_type_dict(self.entity_type_dict, chunk_entity_type_dict)
+            self.relation_type_dict = await self._merge_type_dict(self.relation_type_dict, chunk_relation_type_dict)
 
-        # 更新实体类型字典
-        if not self.kg_schema:
-            self.entity_type_dict = get_new_entity_types_from_response(response=entity_classify_response)
-        else:
-            temp_entity_type_dict = get_new_entity_types_from_response(response=entity_classify_response)
-            self.entity_type_dict = await merge_type_dicts_with_semantic(self.entity_type_dict,
-                                                                         temp_entity_type_dict)
+        if not self.entity_type_dict:
+            return
 
-        relation_classify_prompt = Template(
-            open("common/core/unigraph/implementation/module/schema_construction/prompt/relation_classify_agent.txt").read()
-            # open("backend_temp/common/implementation/implementation/module/schema_construction/prompt/relation_classify_agent.txt").read()
-        )
-        relation_classify_prompt = relation_classify_prompt.render(relation_string=relation_string, language=language)
-
-        relation_classify_response = await self.chatresponse(relation_classify_prompt)
-        # 更新关系类型字典
-        if not self.kg_schema:
-            self.relation_type_dict = get_new_relationship_types_from_response(response=relation_classify_response)
-        else:
-            temp_relation_type_dict = get_new_relationship_types_from_response(response=relation_classify_response)
-            self.relation_type_dict = await merge_type_dicts_with_semantic(self.relation_type_dict,
-                                                                           temp_relation_type_dict)
         entity_type_string = "，".join(self.entity_type_dict.keys())
-        attribute_reasoning_prompt = Template(
-            open("common/core/unigraph/implementation/module/schema_construction/prompt/attribute_reasoning.txt").read()
-            # open("backend_temp/common/implementation/implementation/module/schema_construction/prompt/attribute_reasoning.txt").read()
-        )
-        attribute_reasoning_prompt = attribute_reasoning_prompt.render(entity_type_string = entity_type_string, language=language)
+        attribute_reasoning_prompt = schema_prompts.render("attribute_reasoning", entity_type_string=entity_type_string, language=language)
         attribute_reasoning_response = await self.chatresponse(attribute_reasoning_prompt)
         entity_type_attribute_dict = get_entity_type_attributes_from_response(response=attribute_reasoning_response)
 
-        kg_schema = transform_triplets_to_schema(Triple_source_dict, self.entity_type_dict,self.relation_type_dict, entity_type_attribute_dict)
-        self.kg_schema.extend(kg_schema)
+        # 类型字典已合并完成，查找映射只需构建一次，所有分块共用
+        entity_lookup = build_type_lookup(self.entity_type_dict, last_wins=True)
+        relation_lookup = build_type_lookup(self.relation_type_dict, last_wins=True)
+        for Triple_source_dict, _, _ in chunk_results:
+            kg_schema = transform_triplets_to_schema(Triple_source_dict, self.entity_type_dict, self.relation_type_dict, entity_type_attribute_dict,
+                                                     entity_lookup=entity_lookup, relation_lookup=relation_lookup)
+            self.kg_schema.extend(kg_schema)
+
+    async def _merge_type_dict(self, type_dict, chunk_type_dict):
+        if not chunk_type_dict:
+            return type_dict
+        if not type_dict:
+            return {key: list(dict.fromkeys(values)) for key, values in chunk_type_dict.items()}
+        return await merge_type_dicts_with_semantic(type_dict, chunk_type_dict, self.type_index)
 
 
 # import asyncio
@@ -1,10 +1,8 @@
 import re
 
-import asyncio
 import json
 
-from backend.common.core.unigraph.implementation.module.schema_construction.related_retrieve import batch_get_vectors, \
-    cosine_similarity
+from backend.common.core.unigraph.implementation.module.schema_construction.related_retrieve import TypeVectorIndex
 
 
 def transform_dict(original_dict):
@@ -143,6 +141,35 @@ def get_new_relationship_types_from_response(response):
     return relation_type_dict
 
 
+def normalize_type_member(name):
+    """
+    Normalize an entity or relation instance name for type lookup: trim, collapse whitespace, lowercase
+    """
+    return " ".join(str(name).strip().split()).lower()
+
+
+def build_type_lookup(type_dict, last_wins=False):
+    """
+    Build an inverted map from normalized instance name to type, so each lookup is O(1)
+
+    Args:
+        type_dict: Dictionary mapping types to their instances
+        last_wins: For an instance listed under several types, map it to the last such type instead of the first.
+            convert_to_type_triples resolves to the first type, transform_triplets_to_schema to the last
+
+    Returns:
+        Dictionary mapping normalized instance names to their type
+    """
+    lookup = {}
+    for type_name, members in type_dict.items():
+        for member in members:
+            if last_wins:
+                lookup[normalize_type_member(member)] = type_name
+            else:
+                lookup.setdefault(normalize_type_member(member), type_name)
+    return lookup
+
+
 def convert_to_type_triples(instance_triples, entity_type_dict, relation_type_dict):
     """
     Convert instance triples to type triples with case-insensitive matching and deduplication
@@ -156,40 +183,22 @@ def convert_to_type_triples(instance_triples, entity_type_dict, relation_type_di
         List of deduplicated type triples
     """
     try:
-        def find_entity_type(entity_name):
-            """Find entity type for given entity name (case-insensitive)"""
-            target_lower = entity_name.lower()
-            for entity_type, entities in entity_type_dict.items():
-                # Compare lowercase versions
-                if any(entity.lower() == target_lower for entity in entities):
-                    return entity_type
-            return None
-
-        def find_relation_type(relation_name):
-            """Find relation type for given relation name (case-insensitive with space handling)"""
-            # Normalize relation name: trim + collapse spaces + lowercase
-            normalized_relation = " ".join(relation_name.strip().split()).lower()
-            for relation_type, relations in relation_type_dict.items():
-                # Compare normalized versions
-                if any(" ".join(rel.strip().split()).lower() == normalized_relation for rel in relations):
-                    return relation_type
-            return None
+        # Inverted lookup maps are built once instead of scanning every type for every triple
+        entity_lookup = build_type_lookup(entity_type_dict)
+        relation_lookup = build_type_lookup(relation_type_dict)
 
         typed_triples = []
         seen_triples = set()  # For deduplication
 
         for triple in instance_triples:
-            head_type = find_entity_type(triple['head'])
-            tail_type = find_entity_type(triple['tail'])
-            relation_type = find_relation_type(triple['relation'])
+            head, relation, tail = (normalize_type_member(triple[key]) for key in ('head', 'relation', 'tail'))
+            head_type = entity_lookup.get(head)
+            tail_type = entity_lookup.get(tail)
+            relation_type = relation_lookup.get(relation)
 
             if head_type and tail_type and relation_type:
                 # Create deduplication key (case-insensitive with normalized spaces)
-                triple_key = (
-                    head_type, triple['head'].lower(),
-                    relation_type, " ".join(triple['relation'].strip().split()).lower(),
-                    tail_type, triple['tail'].lower()
-                )
+                triple_key = (head_type, head, relation_type, relation, tail_type, tail)
                 if triple_key not in seen_triples:
                     seen_triples.add(triple_key)
                     typed_triple = {
@@ -231,72 +240,43 @@ def extract_unique_entities_and_relations(triples):
         "relations": sorted(list(relations))
     }
 
-async def merge_type_dicts_with_semantic(dict1, dict2):
+async def merge_type_dicts_with_semantic(dict1, dict2, type_index: TypeVectorIndex = None):
     """
     Merge two type dictionaries using semantic similarity between keys
 
     Args:
         dict1: First dictionary to merge (will be used as base)
         dict2: Second dictionary to merge
+        type_index: Vector index shared across merges so every type name is embedded only once
 
     Returns:
         Merged dictionary with duplicate values removed
     """
-    # Collect all words that need vector representations
-    all_words = list(dict1.keys()) + list(dict2.keys())
-
-    # Batch get vector representations for all words to minimize API calls
-    word_vectors = await batch_get_vectors(all_words)
-
-    # Pre-compute vectors for dict1 keys
-    dict1_vectors = {k: word_vectors[k] for k in dict1.keys()}
+    if type_index is None:
+        type_index = TypeVectorIndex()
 
-    # Initialize result dictionary with dict1 contents
-    merged = dict1.copy()
-    unmatched_keys = set(dict2.keys())  # Track keys from dict2 that haven't been matched
+    # Only names that have never been seen are embedded
+    await type_index.add(list(dict1.keys()) + list(dict2.keys()))
 
-    # Process each key from dict2 concurrently with rate limiting
-    semaphore = asyncio.Semaphore(100)  # Limit concurrent operations
+    # Find the best dict1 key for every dict2 key with one matrix product
+    keys2 = list(dict2.keys())
+    matches = type_index.best_matches(keys2, list(dict1.keys()))
 
-    async def process_item(key2, values2):
-        async with semaphore:
-            # Find most similar key in dict1
-            max_similarity = 0
-            best_match = None
+    # Initialize result dictionary with dict1 contents (copy the value lists so dict1 is not mutated)
+    merged = {k: list(v) for k, v in dict1.items()}
 
-            # Calculate similarity between key2 and each key in dict1
-            for key1, vec1 in dict1_vectors.items():
-                vec2 = word_vectors[key2]
-                similarity = cosine_similarity(vec1, vec2)
-
-                if similarity > max_similarity:
-                    max_similarity = similarity
-                    best_match = key1
-
-            # Only consider matches with similarity > 0.85
-            if max_similarity > 0.85:
-                unmatched_keys.discard(key2)
-                return best_match, values2, None
-            else:
-                return None, None, (key2, values2)
-
-    # Create processing tasks for all items in dict2
-    tasks = [process_item(k, v) for k, v in dict2.items()]
-
-    # Process results as they complete
-    for coro in asyncio.as_completed(tasks):
-        best_match, values_to_merge, new_item = await coro
-
-        if best_match:
+    # Process dict2 in its own order so that the merge result is deterministic
+    for key2, (best_match, max_similarity) in zip(keys2, matches):
+        # Only consider matches with similarity > 0.85
+        if best_match is not None and max_similarity > 0.85:
             # Merge values into existing key from dict1
-            merged[best_match].extend(values_to_merge)
-        elif new_item:
+            merged[best_match].extend(dict2[key2])
+        else:
             # Add new key-value pair to merged dictionary
-            key, values = new_item
-            merged[key] = values.copy()
+            merged.setdefault(key2, []).extend(dict2[key2])
 
-    # Remove duplicate values from merged dictionary
-    return {k: list(set(v)) for k, v in merged.items()}
+    # Remove duplicate values from merged dictionary, keeping first-seen order
+    return {k: list(dict.fromkeys(v)) for k, v in merged.items()}
 
 
 def delete_irrelevant_definitions(kg_schema, definition_dict):
@@ -352,7 +332,8 @@ def get_entity_type_attributes_from_response(response):
 
     return entity_type_attribute_dict
 
-def transform_triplets_to_schema(triplets_dict, entity_types, relation_types, entity_attributes):
+def transform_triplets_to_schema(triplets_dict, entity_types, relation_types, entity_attributes,
+                                 entity_lookup=None, relation_lookup=None):
     """
     将三元组字典转换为符合规范的schema列表
 
@@ -361,23 +342,19 @@ def transform_triplets_to_schema(triplets_dict, entity_types, relation_types, en
         entity_types: 实体类型字典（实体类型 -> [实体名]）
         relation_types: 关系类型字典（关系类型 -> [谓词]）
         entity_attributes: 实体类型 -> 属性列表
+        entity_lookup: 预先构建的 规范化实体名 -> 实体类型 映射（build_type_lookup(..., last_wins=True)），同一schema状态下多次调用时复用
+        relation_lookup: 预先构建的 规范化谓词 -> 关系类型 映射（build_type_lookup(..., last_wins=True)）
 
     返回:
         schema结构列表，每项包含entity type、relation type、source
     """
     result = []
 
-    # 创建实体名称 → 实体类型的映射
-    entity_name_to_type = {}
-    for etype, enames in entity_types.items():
-        for name in enames:
-            entity_name_to_type[name.strip()] = etype
-
-    # 创建谓词名称 → 关系类型的映射
-    relation_name_to_type = {}
-    for rtype, rnames in relation_types.items():
-        for name in rnames:
-            relation_name_to_type[name.strip()] = rtype
+    # 实体名称 → 实体类型、谓词名称 → 关系类型的映射（名称已规范化），同一名称出现在多个类型中时以最后一个类型为准
+    if entity_lookup is None:
+        entity_lookup = build_type_lookup(entity_types, last_wins=True)
+    if relation_lookup is None:
+        relation_lookup = build_type_lookup(relation_types, last_wins=True)
 
     for triplet, source_text in triplets_dict.items():
         try:
@@ -388,9 +365,9 @@ def transform_triplets_to_schema(triplets_dict, entity_types, relation_types, en
             continue  # 跳过格式不正确的
 
         # 尝试映射为类型名
-        left_type = entity_name_to_type.get(left)
-        right_type = entity_name_to_type.get(right)
-        relation_type = relation_name_to_type.get(relation)
+        left_type = entity_lookup.get(normalize_type_member(left))
+        right_type = entity_lookup.get(normalize_type_member(right))
+        relation_type = relation_lookup.get(normalize_type_member(relation))
 
         # 若任一项未匹配到类型名，则跳过该三元组
         if not all([left_type, relation_type, right_type]):
@@ -1,6 +1,7 @@
 
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Tuple
 
+from backend.common.core.unigraph.implementation.module.entity_resolution import EntityResolver
 from backend.common.core.unigraph.implementation.module.kg_constructor import SemanticKGConstructor
 
 
@@ -8,14 +9,41 @@ async def create_kg(
         kg_schema: List,
         schema_definition: Dict,
         text_data: str,
+        extraction_mode: str = "chain",
 ):
     """
     Create KG from documents in the specified directory based on the schema and schema definition provided.
     """
     api_result = list()
-    constructor = SemanticKGConstructor(kg_schema, schema_definition)
+    constructor = SemanticKGConstructor(kg_schema, schema_definition, extraction_mode=extraction_mode)
     semantic_kg, triple_source = await constructor.extract_kg(
         text_data=text_data
     )
     api_result.append({"file_name": "all", "semantic_kg": semantic_kg, "triple_source": triple_source})
     return api_result
+
+
+async def iter_create_kg(
+        kg_schema: List,
+        schema_definition: Dict,
+        text_data: str,
+        extraction_mode: str = "chain",
+) -> AsyncIterator[Dict]:
+    """
+    Stream the KG extraction chunk by chunk. Each yielded item has the same shape as an element of create_kg's result.
+    Cross-chunk entity resolution needs the whole graph, so the caller applies resolve_entities once all chunks are stored.
+    """
+    constructor = SemanticKGConstructor(kg_schema, schema_definition, extraction_mode=extraction_mode)
+    async for _, semantic_kg, triple_source in constructor.iter_extract_kg(text_data=text_data):
+        yield {"file_name": "all", "semantic_kg": semantic_kg, "triple_source": triple_source}
+
+
+async def resolve_entities(
+        entities: Dict[Tuple[str, str], Dict],
+        occurrences: Dict[Tuple[str, str], int],
+) -> Dict[Tuple[str, str], str]:
+    """
+    Resolve near-duplicate entities of a whole graph. Keys are (entity type, entity name).
+    Returns the mapping from each merged entity to the name of its canonical entity.
+    """
+    return await EntityResolver().canonical_names(entities, occurrences)
@@ -11,14 +11,17 @@ from backend.common.core.unigraph.implementation.module.sapperrag.retriver.struc
     LOCAL_SEARCH_SYSTEM_PROMPT
 
 
-async def build_index(entities: List[Dict[str, Any]], relationships: List[Dict[str, Any]], level: int) -> tuple:
+async def build_index(entities: List[Dict[str, Any]], relationships: List[Dict[str, Any]], level: int,
+                      previous_communities: List[Dict[str, Any]] = None, incremental: bool = True) -> tuple:
     """
     构建局部与全局索引用于问答
 
     : param entities: 实体列表
     : param relationships: 关系列表
     : param level: 索引深度
-    : return: 实体列表, 社区报告列表
+    : param previous_communities: 上次构建的社区列表，输入内容未变化的社区沿用上次的报告
+    : param incremental: 是否增量划分社区
+    : return: 实体列表, 社区报告列表, 社区变更计划
     """
     # 将实体和关系转换为KG格式(这里是一个格式的转换器)
     kg_data = transform_data(entities, relationships)
@@ -31,9 +34,10 @@ async def build_index(entities: List[Dict[str, Any]], relationships: List[Dict[s
 
     # 构建索引
     indexer = GraphIndexer()
-    entities, community_reports = await indexer.build_index(entities, relationships, level)
+    entities, community_reports, community_plan = await indexer.build_index(entities, relationships, level,
+                                                                            previous_communities, incremental)
     logger.info("索引构建成功😊")
-    return entities, community_reports
+    return entities, community_reports, community_plan
 
 
 async def query_kg(query: str,
@@ -29,6 +29,11 @@ class Settings(BaseSettings):
     MYSQL_DATABASE: str = Field(description="MySQL数据库名")
     MYSQL_CHARSET: str = Field(description="")
 
+    # LLM API 配置
+    API_KEY: Optional[str] = Field(default=None, description="LLM API密钥")
+    BASE_URL: Optional[str] = Field(default=None, description="LLM API地址")
+    EMBEDDING_MODEL: str = Field(default="text-embedding-3-small", description="向量嵌入模型")
+
     # 日志配置
     log_level: str = Field(default="INFO", description="日志级别")
     log_file: str = Field(default="./logs/app.log", description="日志文件路径")
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对比分步提取（chain）与单次融合提取（fused）两种知识图谱提取模式
+
+在 data/math 的课程上分别运行两种模式，统计耗时、LLM 调用次数、提示词/响应字符数、三元组数量，
+以及两种模式提取出的三元组重合度。
+
+用法:
+    python -m backend.data.benchmark_extraction --schema-uuid <架构uuid> --limit 5
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from backend.app.recommendation.schema import GetSchemaGraphDetail
+from backend.app.recommendation.services.knowledge_graph_service import knowledge_graph_service
+from backend.app.recommendation.services.schema_graph_service import schema_graph_service
+from backend.common.core.llm.response_getter import GenericResponseGetter
+from backend.common.core.unigraph.implementation.module.kg_constructor import SemanticKGConstructor
+from backend.data.process_math_data import MathDataProcessor
+from backend.utils.serializers import select_as_dict
+
+MODES = ("chain", "fused")
+
+
+class CountingResponseGetter(GenericResponseGetter):
+    """统计调用次数与字符数的响应获取器"""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_chars = 0
+        self.response_chars = 0
+
+    async def get_response(self, query: str, **kwargs) -> str:
+        response = await GenericResponseGetter.get_response(query=query, **kwargs)
+        self.calls += 1
+        self.prompt_chars += len(query)
+        self.response_chars += len(response or "")
+        return response
+
+
+class CountingResponseGetterFactory:
+    def __init__(self, response_getter: CountingResponseGetter):
+        self.response_getter = response_getter
+
+    def create(self) -> CountingResponseGetter:
+        return self.response_getter
+
+
+async def run_mode(mode: str, dialogue: list, kg_schema: list, schema_definition: dict) -> tuple[dict, set]:
+    """运行一种提取模式，返回统计信息与三元组集合"""
+    response_getter = CountingResponseGetter()
+    constructor = SemanticKGConstructor(kg_schema, schema_definition, extraction_mode=mode)
+    constructor.ai_executor.response_getter_factory = CountingResponseGetterFactory(response_getter)
+
+    start = time.perf_counter()
+    kg, _ = await constructor.extract_kg(text_data=dialogue)
+    seconds = time.perf_counter() - start
+
+    triples = {
+        (t["DirectionalEntity"]["Name"], t["Relation"]["Name"], t["DirectedEntity"]["Name"]) for t in kg
+    }
+    entities = {name for head, _, tail in triples for name in (head, tail)}
+    stats = {
+        "seconds": round(seconds, 2),
+        "llm_calls": response_getter.calls,
+        "prompt_chars": response_getter.prompt_chars,
+        "response_chars": response_getter.response_chars,
+        "triples": len(triples),
+        "entities": len(entities),
+    }
+    return stats, triples
+
+
+async def benchmark(schema_uuid: str, limit: int) -> dict:
+    schema_graph = await schema_graph_service.get_schema_graph(uuid=schema_uuid)
+    schema_data = GetSchemaGraphDetail(**select_as_dict(schema_graph))
+    kg_schema, schema_definition = knowledge_graph_service.form_schema(schema_data)
+
+    totals = {mode: {} for mode in MODES}
+    lessons = []
+    for record in MathDataProcessor().iter_records(limit=limit):
+        dialogue = record.get("identification_result") or []
+        lesson = {"id": record.get("id"), "class_name": record.get("class_name")}
+        triple_sets = {}
+        for mode in MODES:
+            stats, triple_sets[mode] = await run_mode(mode, dialogue, kg_schema, schema_definition)
+            lesson[mode] = stats
+            for key, value in stats.items():
+                totals[mode][key] = round(totals[mode].get(key, 0) + value, 2)
+
+        union = triple_sets["chain"] | triple_sets["fused"]
+        lesson["triple_jaccard"] = round(len(triple_sets["chain"] & triple_sets["fused"]) / len(union), 3) if union else 1.0
+        lessons.append(lesson)
+        print(json.dumps(lesson, ensure_ascii=False))
+
+    return {"lessons": len(lessons), "totals": totals}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="知识图谱提取模式对比")
+    parser.add_argument("--schema-uuid", required=True, help="使用的知识架构 uuid")
+    parser.add_argument("--limit", type=int, default=5, help="参与对比的课程数量")
+    args = parser.parse_args()
+
+    results = asyncio.run(benchmark(args.schema_uuid, args.limit))
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
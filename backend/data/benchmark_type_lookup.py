@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+类型查找微基准：对比逐类型线性扫描与倒排查找映射在 schema 规模增长时的耗时
+
+随着实例数从数百增长到数千，线性扫描的耗时按 三元组数 × 实例数 增长，
+倒排映射只随 三元组数 + 实例数 线性增长。
+
+用法:
+    python -m backend.data.benchmark_type_lookup --sizes 100 1000 5000 --triples 2000
+"""
+import argparse
+import random
+import time
+
+from backend.common.core.unigraph.implementation.module.schema_construction.utils import convert_to_type_triples, \
+    transform_triplets_to_schema
+
+
+def build_schema_state(instances: int, types: int = 50):
+    """构造指定实例数的实体类型字典与关系类型字典"""
+    entity_type_dict = {f"EntityType{t}": [] for t in range(types)}
+    relation_type_dict = {f"RelationType{t}": [] for t in range(types)}
+    for i in range(instances):
+        entity_type_dict[f"EntityType{i % types}"].append(f"Entity {i}")
+        relation_type_dict[f"RelationType{i % types}"].append(f"relation {i}")
+    return entity_type_dict, relation_type_dict
+
+
+def build_triples(instances: int, count: int):
+    """构造随机实例三元组，其中约一成无法匹配到类型"""
+    rng = random.Random(0)
+    triples = []
+    for _ in range(count):
+        head, relation, tail = (rng.randrange(int(instances * 1.1)) for _ in range(3))
+        triples.append({"head": f"entity  {head}", "relation": f" Relation {relation} ", "tail": f"ENTITY {tail}"})
+    return triples
+
+
+def convert_by_scan(instance_triples, entity_type_dict, relation_type_dict):
+    """倒排映射之前的实现：每个三元组逐类型扫描全部实例"""
+    def normalize(name):
+        return " ".join(name.strip().split()).lower()
+
+    def find_type(name, type_dict):
+        target = normalize(name)
+        for type_name, members in type_dict.items():
+            if any(normalize(member) == target for member in members):
+                return type_name
+        return None
+
+    typed_triples = []
+    for triple in instance_triples:
+        head_type = find_type(triple["head"], entity_type_dict)
+        tail_type = find_type(triple["tail"], entity_type_dict)
+        relation_type = find_type(triple["relation"], relation_type_dict)
+        if head_type and tail_type and relation_type:
+            typed_triples.append((head_type, relation_type, tail_type))
+    return typed_triples
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="类型查找微基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 500, 1000, 2000, 5000], help="schema 中的实例数")
+    parser.add_argument("--triples", type=int, default=2000, help="每轮转换的三元组数")
+    parser.add_argument("--skip-scan", action="store_true", help="跳过线性扫描基线（实例数很大时耗时较长）")
+    args = parser.parse_args()
+
+    print(f"{'instances':>10} {'scan(s)':>10} {'convert(s)':>11} {'transform(s)':>13} {'matched':>8}")
+    for size in args.sizes:
+        entity_type_dict, relation_type_dict = build_schema_state(size)
+        triples = build_triples(size, args.triples)
+        triplets_dict = {f"({t['head']}, {t['relation']}, {t['tail']})": "source" for t in triples}
+
+        scan_time = None
+        if not args.skip_scan:
+            scan_time, scanned = timed(convert_by_scan, triples, entity_type_dict, relation_type_dict)
+        convert_time, converted = timed(convert_to_type_triples, triples, entity_type_dict, relation_type_dict)
+        transform_time, _ = timed(transform_triplets_to_schema, triplets_dict, entity_type_dict, relation_type_dict, {})
+        if scan_time is not None:
+            # 倒排映射应与线性扫描匹配到完全相同的类型三元组
+            expected = {(t[0], t[1], t[2]) for t in scanned}
+            actual = {(t['DirectionalEntity']['type'], t['Relation']['type'], t['DirectedEntity']['type']) for t in converted}
+            assert actual == expected, "倒排查找与线性扫描结果不一致"
+
+        scan_column = f"{scan_time:>10.4f}" if scan_time is not None else f"{'-':>10}"
+        print(f"{size:>10} {scan_column} {convert_time:>11.4f} {transform_time:>13.4f} {len(converted):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+将 data/math 目录下的课程数据直接导入 RAG 入库流程，不经过 HTTP 接口
+
+用法:
+    python -m backend.data.ingest_math_data --limit 100 --workers 8
+"""
+import argparse
+import asyncio
+import json
+
+from backend.app.recommendation.services.rag_service import RagService
+from backend.data.process_math_data import MathDataProcessor
+from backend.database.db_mysql import create_table
+
+
+async def ingest(data_dir: str, limit: int | None, workers: int | None, use_processes: bool) -> dict:
+    """
+    边解析边入库：解析在线程池/进程池中进行，入库速度只受 LLM 吞吐限制
+
+    :param data_dir: 数据目录路径（相对 backend/data）
+    :param limit: 限制处理的文件数量
+    :param workers: 并行解析的工作者数量
+    :param use_processes: 是否使用进程池解析
+    :return: 入库结果统计
+    """
+    await create_table()
+    processor = MathDataProcessor(data_dir=data_dir)
+    records = processor.aiter_records(limit=limit, workers=workers, use_processes=use_processes)
+    return await RagService.process_course_data(course_data=records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数学课程数据直接入库")
+    parser.add_argument("--data-dir", default="math", help="数据目录，相对 backend/data")
+    parser.add_argument("--limit", type=int, default=None, help="限制处理的文件数量")
+    parser.add_argument("--workers", type=int, default=None, help="并行解析的工作者数量，默认 CPU 核数")
+    parser.add_argument("--processes", action="store_true", help="使用进程池而非线程池解析文件")
+    args = parser.parse_args()
+
+    results = asyncio.run(ingest(args.data_dir, args.limit, args.workers, args.processes))
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+一次性数据库迁移：为已有数据库补齐新增的列，并把 courses.dialogue 中的旧对话回填到 course_dialogues
+
+create_all 只会创建缺失的表，不会为已存在的表添加新列，因此升级前已建库的环境需要执行一次本脚本。
+脚本可重复执行：已存在的列不会重复添加，已有压缩对话的课程不会重复回填。
+
+用法:
+    python -m backend.data.migrate_course_dialogues
+    python -m backend.data.migrate_course_dialogues --drop-legacy-column
+"""
+import argparse
+import asyncio
+import json
+
+from sqlalchemy import inspect, text
+
+from backend.app.recommendation.crud.course_dialogue import course_dialogue_dao
+from backend.database.db_mysql import async_db_session, async_engine, create_table
+
+# 已存在的表上新增的列：(表名, 列名, 列定义)
+NEW_COLUMNS = [
+    ("courses", "dialogue_hash", "VARCHAR(64) NULL"),
+    ("courses", "chunk_hashes", "JSON NULL"),
+    ("reports", "chunk_hashes", "JSON NULL"),
+    ("knowledge_graph", "extraction_mode", "VARCHAR(20) NOT NULL DEFAULT 'chain' COMMENT 'Extraction Mode(chain/fused)'"),
+]
+
+
+async def table_columns() -> dict[str, set[str]]:
+    """读取数据库中各表现有的列名"""
+    def inspect_columns(connection):
+        inspector = inspect(connection)
+        return {table: {column["name"] for column in inspector.get_columns(table)} for table in inspector.get_table_names()}
+
+    async with async_engine.connect() as connection:
+        return await connection.run_sync(inspect_columns)
+
+
+async def add_missing_columns(columns: dict[str, set[str]]) -> list[str]:
+    """
+    为已存在的表添加缺失的列
+
+    :param columns: 各表现有的列名
+    :return: 新增的列
+    """
+    added = []
+    async with async_engine.begin() as connection:
+        for table, column, definition in NEW_COLUMNS:
+            if table in columns and column not in columns[table]:
+                await connection.execute(text(f"ALTER TABLE `{table}` ADD COLUMN `{column}` {definition}"))
+                added.append(f"{table}.{column}")
+    return added
+
+
+async def backfill_dialogues(batch_size: int) -> int:
+    """
+    将 courses.dialogue 中的旧对话压缩写入 course_dialogues，已有压缩对话的课程跳过
+
+    :param batch_size: 每个事务回填的课程数
+    :return: 回填的课程数
+    """
+    stmt = text(
+        "SELECT c.uuid, c.dialogue FROM courses c "
+        "LEFT JOIN course_dialogues d ON d.course_uuid = c.uuid "
+        "WHERE d.course_uuid IS NULL AND c.dialogue IS NOT NULL "
+        "ORDER BY c.uuid LIMIT :limit"
+    )
+    total = 0
+    while True:
+        async with async_db_session.begin() as db:
+            rows = (await db.execute(stmt, {"limit": batch_size})).all()
+            for course_uuid, dialogue in rows:
+                if isinstance(dialogue, (str, bytes)):
+                    dialogue = json.loads(dialogue)
+                await course_dialogue_dao.save_async(db, course_uuid=course_uuid, dialogue=dialogue)
+        total += len(rows)
+        if len(rows) < batch_size:
+            return total
+
+
+async def migrate(drop_legacy_column: bool, batch_size: int) -> dict:
+    await create_table()
+    columns = await table_columns()
+    added = await add_missing_columns(columns)
+
+    backfilled = 0
+    if "dialogue" in columns.get("courses", set()):
+        backfilled = await backfill_dialogues(batch_size)
+        if drop_legacy_column:
+            async with async_engine.begin() as connection:
+                await connection.execute(text("ALTER TABLE `courses` DROP COLUMN `dialogue`"))
+    return {"added_columns": added, "backfilled_dialogues": backfilled}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="补齐新增列并回填课程对话")
+    parser.add_argument("--drop-legacy-column", action="store_true", help="回填完成后删除 courses.dialogue 列")
+    parser.add_argument("--batch-size", type=int, default=100, help="每个事务回填的课程数")
+    args = parser.parse_args()
+
+    result = asyncio.run(migrate(args.drop_legacy_column, args.batch_size))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,29 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import asyncio
 import json
 import os
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, AsyncIterator, Tuple
+
+import orjson
+
+
+def parse_json_file(file_path: Path) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    解析单个JSON文件，供线程池或进程池调用
+
+    :param file_path: 文件路径
+    :return: (解析后的数据, 错误信息)，二者只有一个非空
+    """
+    try:
+        return orjson.loads(file_path.read_bytes()), None
+    except orjson.JSONDecodeError as e:
+        return None, f"JSON解析错误 {file_path.name}: {e}"
+    except Exception as e:
+        return None, f"文件读取错误 {file_path.name}: {e}"
 
 
 class MathDataProcessor:
@@ -36,61 +56,128 @@ class MathDataProcessor:
         :param file_path: 文件路径
         :return: 解析后的字典数据或None
         """
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                self.processed_files += 1
-                return data
-        except json.JSONDecodeError as e:
-            print(f"JSON解析错误 {file_path.name}: {e}")
-            return None
-        except Exception as e:
-            print(f"文件读取错误 {file_path.name}: {e}")
+        data, error = parse_json_file(file_path)
+        if error:
+            print(error)
             return None
+        self.processed_files += 1
+        return data
     
-    def process_files(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    def list_files(self, limit: Optional[int] = None) -> List[Path]:
         """
-        处理JSON文件并提取数据
-        
+        获取待处理的JSON文件列表
+
         :param limit: 限制处理的文件数量，None表示处理所有文件
-        :return: 包含所有数据的列表
+        :return: 按文件名排序的文件路径列表
         """
         if not self.data_dir.exists():
             print(f"错误：目录 {self.data_dir} 不存在")
             return []
-        
-        # 获取所有JSON文件
+
         json_files = sorted(self.data_dir.glob("*.json"))
-        
         if not json_files:
             print(f"警告：目录 {self.data_dir} 中没有找到JSON文件")
             return []
-        
-        # 应用限制
+
         if limit is not None and limit > 0:
             json_files = json_files[:limit]
             print(f"限制处理文件数量为: {limit}")
-        
-        print(f"开始处理 {len(json_files)} 个文件...")
-        
-        # 重置计数器
+        return json_files
+
+    def iter_records(
+        self, limit: Optional[int] = None, workers: Optional[int] = None, use_processes: bool = False
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        在线程池或进程池中并行解析JSON文件，按文件名顺序逐条产出数据
+
+        同一时间最多有 workers * 4 个文件处于解析中或等待消费，内存占用与目录大小无关
+
+        :param limit: 限制处理的文件数量，None表示处理所有文件
+        :param workers: 并行解析的工作者数量，默认取 CPU 核数
+        :param use_processes: 是否使用进程池（文件较大、解析占用CPU时使用）
+        :return: 数据生成器
+        """
+        json_files = self.list_files(limit=limit)
+        self.total_files = len(json_files)
         self.processed_files = 0
-        all_data = []
-        
-        for i, file_path in enumerate(json_files, 1):
-            print(f"正在处理 ({i}/{len(json_files)}): {file_path.name}")
-            
-            data = self.load_single_file(file_path)
-            if data is not None:
-                all_data.append(data)
-            
-            # 显示进度
-            if i % 50 == 0 or i == len(json_files):
-                print(f"进度: {i}/{len(json_files)} ({i/len(json_files)*100:.1f}%)")
+        if not json_files:
+            return
+
+        workers = workers or os.cpu_count() or 4
+        executor: Executor = ProcessPoolExecutor(workers) if use_processes else ThreadPoolExecutor(workers)
+        window = workers * 4
+        files = iter(json_files)
+        pending = deque()
+        try:
+            for file_path in files:
+                pending.append(executor.submit(parse_json_file, file_path))
+                if len(pending) >= window:
+                    break
+
+            done = 0
+            while pending:
+                data, error = pending.popleft().result()
+                # 每消费一个结果补充一个解析任务，保持窗口大小
+                next_file = next(files, None)
+                if next_file is not None:
+                    pending.append(executor.submit(parse_json_file, next_file))
+
+                done += 1
+                if error:
+                    print(error)
+                else:
+                    self.processed_files += 1
+                    yield data
+
+                if done % 50 == 0 or done == len(json_files):
+                    print(f"进度: {done}/{len(json_files)} ({done/len(json_files)*100:.1f}%)")
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def aiter_records(
+        self, limit: Optional[int] = None, workers: Optional[int] = None, use_processes: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        iter_records 的异步版本，在线程中等待解析结果，不阻塞事件循环
+
+        :param limit: 限制处理的文件数量，None表示处理所有文件
+        :param workers: 并行解析的工作者数量，默认取 CPU 核数
+        :param use_processes: 是否使用进程池
+        :return: 异步数据生成器
+        """
+        records = self.iter_records(limit=limit, workers=workers, use_processes=use_processes)
+        sentinel = object()
+        # 生成器只在这一个线程中推进；取消等待并不会中断线程中正在执行的 next，
+        # 关闭生成器前必须等它返回，否则 close() 会抛出 "generator already executing"
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = None
+        try:
+            while True:
+                future = executor.submit(next, records, sentinel)
+                data = await asyncio.wrap_future(future)
+                if data is sentinel:
+                    break
+                yield data
+        finally:
+            if future is not None and not future.done():
+                await asyncio.to_thread(wait, [future])
+            executor.shutdown(wait=False)
+            records.close()
+
+    def process_files(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        处理JSON文件并提取数据
         
-        print(f"\n处理完成！")
-        print(f"成功处理: {self.processed_files} 个文件")
-        print(f"失败文件: {len(json_files) - self.processed_files} 个")
+        :param limit: 限制处理的文件数量，None表示处理所有文件
+        :return: 包含所有数据的列表
+        """
+        all_data = list(self.iter_records(limit=limit))
+        if self.total_files:
+            print(f"\n处理完成！")
+            print(f"成功处理: {self.processed_files} 个文件")
+            print(f"失败文件: {self.total_files - self.processed_files} 个")
         
         return all_data
     
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+from backend.common.core.unigraph.implementation.module.sapperrag.index.graph.reporting.community_detection import \
+    CommunityDetection
+from backend.common.core.unigraph.implementation.module.sapperrag.model.community import Community
+from backend.common.core.unigraph.implementation.module.sapperrag.model.entity import Entity
+from backend.common.core.unigraph.implementation.module.sapperrag.model.relationship import Relationship
+
+# 三个连通分量：A-B-C、D-E、F-G
+EDGES = [("r1", "A", "B"), ("r2", "B", "C"), ("r3", "D", "E"), ("r4", "F", "G")]
+
+
+def make_graph(edges=EDGES, sources=None, attributes=None):
+    sources = sources or {}
+    attributes = attributes or {}
+    relationships = [
+        Relationship(id=rid, source=source, target=target, type="关联", name="包含", attributes={},
+                     triple_source=sources.get(rid, f"{source}{target}"))
+        for rid, source, target in edges
+    ]
+    entity_ids = sorted({entity_id for _, source, target in edges for entity_id in (source, target)})
+    entities = [Entity(id=entity_id, name=entity_id, type="概念", attributes=dict(attributes.get(entity_id, {})))
+                for entity_id in entity_ids]
+    detector = CommunityDetection(max_comm_size=20, max_level=0, seed=5, workers=1)
+    vertices, graph_edges = detector.load_data(entities, relationships)
+    return detector, detector.create_graph(vertices, graph_edges), relationships
+
+
+def split(detector, graph, relationships, previous_communities):
+    subgraph, vertex_ids, touched, component_of, kept, incremental = \
+        detector.split_touched_components(graph, relationships, previous_communities)
+    return sorted(vertex_ids.tolist()), sorted(r.id for r in touched), component_of, kept, incremental
+
+
+def community(cid, level, entity_ids):
+    return Community(id=cid, title=cid, level=level, entity_ids=list(entity_ids))
+
+
+def first_build(edges=EDGES, members=("ABC", "DE", "FG")):
+    """首次构建：按给定成员划分社区，返回保存的社区列表"""
+    detector, graph, relationships = make_graph(edges)
+    _, _, component_of, kept, incremental = split(detector, graph, relationships, [])
+    assert not incremental and kept == []
+    communities = [community(f"c{index}", 0, entity_ids) for index, entity_ids in enumerate(members, 1)]
+    changed, plan = detector.reconcile_communities(communities, relationships, component_of, [], kept)
+    assert changed == communities
+    return [{"id": c.id, "level": c.level, "attributes": c.attributes} for c in communities]
+
+
+def test_split_without_previous_communities_rebuilds_everything():
+    detector, graph, relationships = make_graph()
+    vertex_ids, touched, _, kept, incremental = split(detector, graph, relationships, [])
+    assert not incremental
+    assert vertex_ids == list("ABCDEFG")
+    assert touched == ["r1", "r2", "r3", "r4"]
+    assert kept == []
+
+
+def test_split_keeps_unchanged_components():
+    previous = first_build()
+    detector, graph, relationships = make_graph()
+    vertex_ids, touched, _, kept, incremental = split(detector, graph, relationships, previous)
+    assert incremental
+    assert vertex_ids == [] and touched == []
+    assert sorted(kept) == ["c1", "c2", "c3"]
+
+
+def test_split_touches_component_with_new_edge():
+    previous = first_build()
+    detector, graph, relationships = make_graph(EDGES + [("r5", "C", "H")])
+    vertex_ids, touched, _, kept, _ = split(detector, graph, relationships, previous)
+    assert vertex_ids == list("ABCH")
+    assert touched == ["r1", "r2", "r5"]
+    assert sorted(kept) == ["c2", "c3"]
+
+
+def test_split_touches_component_with_changed_content():
+    previous = first_build()
+    # 关系 ID 不变，只有溯源文本或实体属性变化
+    detector, graph, relationships = make_graph(sources={"r3": "DE\n新的溯源"}, attributes={"F": {"定义": "新的定义"}})
+    vertex_ids, touched, _, kept, _ = split(detector, graph, relationships, previous)
+    assert vertex_ids == list("DEFG")
+    assert touched == ["r3", "r4"]
+    assert kept == ["c1"]
+
+
+def test_split_ignores_degree_attribute():
+    previous = first_build()
+    detector, graph, relationships = make_graph()
+    for details in detector.node_details_map.values():
+        details["attributes"]["degree"] += 10
+    _, touched, _, kept, _ = split(detector, graph, relationships, previous)
+    assert touched == []
+    assert sorted(kept) == ["c1", "c2", "c3"]
+
+
+def test_split_without_signatures_rebuilds_everything():
+    previous = [{"id": "old", "level": 0, "attributes": {}}]
+    detector, graph, relationships = make_graph()
+    vertex_ids, _, _, kept, incremental = split(detector, graph, relationships, previous)
+    assert not incremental
+    assert vertex_ids == list("ABCDEFG")
+    assert kept == []
+
+
+def test_reconcile_reuses_ids_of_communities_with_changed_content():
+    previous = first_build()
+    # A-B-C 新增 C-H 后拆成两个社区；D-E 的溯源文本变化；F-G 未变化
+    edges = EDGES + [("r5", "C", "H"), ("r6", "H", "I")]
+    detector, graph, relationships = make_graph(edges, sources={"r3": "DE\n新的溯源"})
+    _, _, component_of, kept, _ = split(detector, graph, relationships, previous)
+    assert kept == ["c3"]
+
+    touched = [r for r in relationships if r.id != "r4"]
+    communities = [community("n1", 0, "ABC"), community("n2", 0, "HI"), community("n3", 0, "DE")]
+    changed, plan = detector.reconcile_communities(communities, touched, component_of, previous, kept)
+
+    # n1 成员不变，但关联关系多了 r5，需要重新生成报告并沿用 c1 的 ID
+    # n3 成员与关系 ID 不变，但溯源文本变化，同样需要重新生成报告
+    assert [c.id for c in changed] == ["n1", "n2", "n3"]
+    assert plan["reused"] == {"n1": "c1", "n3": "c2"}
+    assert plan["retagged"] == {}
+    assert plan["kept"] == ["c3"]
+    assert plan["deleted"] == []
+
+
+def test_reconcile_retags_community_whose_component_changed():
+    # A-B-C 与 D-E 经 C-D 相连，同一分量内划分为两个社区
+    edges = EDGES + [("r9", "C", "D")]
+    previous = first_build(edges, members=("ABC", "DE", "FG"))
+    # 新增 E-J：分量签名变化，A-B-C 社区的成员与关联关系均不变，只更新签名并保留报告
+    detector, graph, relationships = make_graph(edges + [("r7", "E", "J")])
+    _, touched_ids, component_of, kept, _ = split(detector, graph, relationships, previous)
+    assert kept == ["c3"]
+    assert touched_ids == ["r1", "r2", "r3", "r7", "r9"]
+
+    touched = [r for r in relationships if r.id != "r4"]
+    communities = [community("n1", 0, "ABC"), community("n2", 0, "DEJ")]
+    changed, plan = detector.reconcile_communities(communities, touched, component_of, previous, kept)
+
+    assert [c.id for c in changed] == ["n2"]
+    assert plan["reused"] == {}
+    assert list(plan["retagged"]) == ["c1"]
+    assert plan["retagged"]["c1"]["component"] == component_of["A"]
+    assert plan["retagged"]["c1"]["component"] != previous[0]["attributes"]["component"]
+    assert plan["kept"] == ["c3", "c1"]
+    assert plan["deleted"] == ["c2"]
+
+
+def test_reconcile_deletes_previous_communities_without_match():
+    previous = first_build()
+    # 删除 r2 后 A-B-C 拆分：原社区 c1 不再存在
+    edges = [edge for edge in EDGES if edge[0] != "r2"]
+    detector, graph, relationships = make_graph(edges)
+    _, _, component_of, kept, _ = split(detector, graph, relationships, previous)
+    assert sorted(kept) == ["c2", "c3"]
+
+    touched = [r for r in relationships if r.id == "r1"]
+    communities = [community("n1", 0, "AB")]
+    changed, plan = detector.reconcile_communities(communities, touched, component_of, previous, kept)
+
+    assert [c.id for c in changed] == ["n1"]
+    assert plan["reused"] == {}
+    assert plan["deleted"] == ["c1"]
+    assert sorted(plan["kept"]) == ["c2", "c3"]
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+
+from backend.common.core.unigraph.implementation.module.extraction_cache import ExtractionCache
+from backend.common.core.unigraph.implementation.module.kg_constructor import SemanticKGConstructor
+
+# chunk_with_overlap 切出的分块是话语字典列表
+DIALOGUE_CHUNK = [
+    {"speaker": "教师", "start_time": 0, "text": "一次函数的图像是一条直线"},
+    {"speaker": "学生", "start_time": 5, "text": "斜率决定直线的倾斜程度"},
+]
+
+TRIPLE = {
+    "DirectionalEntity": {"Type": "概念", "Name": "一次函数", "Attributes": {}},
+    "Relation": {"Type": "性质", "Name": "图像是", "Attributes": {}},
+    "DirectedEntity": {"Type": "概念", "Name": "直线", "Attributes": {}},
+    "ID": "a1b2c3d4e5f60718",
+}
+
+
+def make_constructor(tmp_path):
+    cache = ExtractionCache(str(tmp_path / "cache" / "extraction.sqlite3"))
+    constructor = SemanticKGConstructor(kg_schema=[], schema_definition={}, extraction_cache=cache)
+    calls = []
+
+    async def execute(module_executor, **kwargs):
+        calls.append(kwargs["chunk"])
+        return [TRIPLE], [{"ID": TRIPLE["ID"], "TripleSource": "一次函数的图像是一条直线"}]
+
+    constructor.ai_executor.execute = execute
+    return constructor, calls
+
+
+def test_make_key_accepts_dialogue_chunk():
+    key = ExtractionCache.make_key(DIALOGUE_CHUNK, "schema", "chain")
+    # 字典键顺序不同但内容相同的分块得到相同的键
+    reordered = [dict(reversed(list(utterance.items()))) for utterance in DIALOGUE_CHUNK]
+    assert ExtractionCache.make_key(reordered, "schema", "chain") == key
+    assert ExtractionCache.make_key(DIALOGUE_CHUNK[:1], "schema", "chain") != key
+    assert ExtractionCache.make_key(DIALOGUE_CHUNK, "schema", "fused") != key
+
+
+def test_process_chunk_caches_dialogue_chunk(tmp_path):
+    constructor, calls = make_constructor(tmp_path)
+
+    first = asyncio.run(constructor._process_chunk(DIALOGUE_CHUNK))
+    second = asyncio.run(constructor._process_chunk([dict(utterance) for utterance in DIALOGUE_CHUNK]))
+
+    assert calls == [DIALOGUE_CHUNK]
+    assert list(second) == list(first)
+
+
+def test_process_chunk_does_not_cache_empty_result(tmp_path):
+    constructor, calls = make_constructor(tmp_path)
+
+    async def execute(module_executor, **kwargs):
+        calls.append(kwargs["chunk"])
+        return [], {}
+
+    constructor.ai_executor.execute = execute
+    asyncio.run(constructor._process_chunk(DIALOGUE_CHUNK))
+    asyncio.run(constructor._process_chunk(DIALOGUE_CHUNK))
+
+    assert len(calls) == 2
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+from backend.common.core.unigraph.implementation.module.schema_construction.utils import build_type_lookup, \
+    convert_to_type_triples, transform_triplets_to_schema
+
+# "函数" 同时列在两个实体类型下
+ENTITY_TYPES = {"数学概念": ["函数", "直线"], "数学对象": [" 函数 ", "图像"]}
+RELATION_TYPES = {"性质": ["图像是"], "组成": ["图像是", "包含"]}
+
+
+def test_build_type_lookup_normalizes_names():
+    lookup = build_type_lookup({"关系": ["  Is   Part of "]})
+    assert lookup == {"is part of": "关系"}
+
+
+def test_build_type_lookup_first_or_last_wins():
+    assert build_type_lookup(ENTITY_TYPES)["函数"] == "数学概念"
+    assert build_type_lookup(ENTITY_TYPES, last_wins=True)["函数"] == "数学对象"
+
+
+def test_convert_to_type_triples_uses_first_type():
+    triples = [{"head": "函数", "relation": "图像是", "tail": "直线"}]
+    typed = convert_to_type_triples(triples, ENTITY_TYPES, RELATION_TYPES)
+    assert [(t["DirectionalEntity"]["type"], t["Relation"]["type"], t["DirectedEntity"]["type"]) for t in typed] == \
+        [("数学概念", "性质", "数学概念")]
+
+
+def test_transform_triplets_to_schema_uses_last_type():
+    schema = transform_triplets_to_schema({"(函数, 图像是, 直线)": "函数的图像是直线"}, ENTITY_TYPES, RELATION_TYPES, {})
+    assert [(s["schema"]["DirectionalEntityType"]["Name"], s["schema"]["RelationType"],
+             s["schema"]["DirectedEntityType"]["Name"]) for s in schema] == [("数学对象", "组成", "数学概念")]
+
+
+def test_transform_triplets_to_schema_with_prebuilt_lookups():
+    triplets = {"(函数, 图像是, 直线)": "函数的图像是直线"}
+    prebuilt = transform_triplets_to_schema(
+        triplets, ENTITY_TYPES, RELATION_TYPES, {},
+        entity_lookup=build_type_lookup(ENTITY_TYPES, last_wins=True),
+        relation_lookup=build_type_lookup(RELATION_TYPES, last_wins=True))
+    assert prebuilt == transform_triplets_to_schema(triplets, ENTITY_TYPES, RELATION_TYPES, {})